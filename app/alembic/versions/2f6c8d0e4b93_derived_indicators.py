@@ -0,0 +1,42 @@
+"""derived_indicators
+
+Revision ID: 2f6c8d0e4b93
+Revises: 7d24e9b1f0a8
+Create Date: 2026-10-18 16:48:30.512406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6c8d0e4b93'
+down_revision = '7d24e9b1f0a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'derived_indicators',
+        sa.Column('indicator_id', sa.Integer(), nullable=False),
+        sa.Column('expression', sa.String(), nullable=False),
+        sa.Column('variables', postgresql.JSONB(), nullable=False),
+        sa.Column('input_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('materialized', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+        sa.PrimaryKeyConstraint('indicator_id'),
+    )
+    op.create_index(
+        'ix_derived_indicators_input_ids', 'derived_indicators', ['input_ids'], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_derived_indicators_input_ids', table_name='derived_indicators')
+    op.drop_table('derived_indicators')
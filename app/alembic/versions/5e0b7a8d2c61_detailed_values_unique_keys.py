@@ -0,0 +1,73 @@
+"""detailed_values_unique_keys
+
+Revision ID: 5e0b7a8d2c61
+Revises: 9a1d3c7e52f4
+Create Date: 2026-10-18 11:40:05.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b7a8d2c61'
+down_revision = '9a1d3c7e52f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep only the most recently inserted band for every key, NULL bounds are equal in PARTITION BY
+    op.execute(
+        """
+        DELETE FROM detailed_indicator_values
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY indicator_id, oktmo, year, source, age_start, age_end ORDER BY id DESC
+                ) AS rn
+                FROM detailed_indicator_values
+                WHERE oktmo IS NOT NULL
+            ) duplicates
+            WHERE rn > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM detailed_indicator_values
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY indicator_id, territory_id, year, source, age_start, age_end ORDER BY id DESC
+                ) AS rn
+                FROM detailed_indicator_values
+                WHERE oktmo IS NULL
+            ) duplicates
+            WHERE rn > 1
+        )
+        """
+    )
+    # NULLS NOT DISTINCT requires PostgreSQL 15+
+    op.create_index(
+        'ux_detailed_indicator_values_oktmo',
+        'detailed_indicator_values',
+        ['indicator_id', 'oktmo', 'year', 'source', 'age_start', 'age_end'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NOT NULL'),
+        postgresql_nulls_not_distinct=True,
+    )
+    op.create_index(
+        'ux_detailed_indicator_values_territory_id',
+        'detailed_indicator_values',
+        ['indicator_id', 'territory_id', 'year', 'source', 'age_start', 'age_end'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NULL'),
+        postgresql_nulls_not_distinct=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_detailed_indicator_values_territory_id', table_name='detailed_indicator_values')
+    op.drop_index('ux_detailed_indicator_values_oktmo', table_name='detailed_indicator_values')
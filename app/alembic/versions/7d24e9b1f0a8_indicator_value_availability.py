@@ -0,0 +1,64 @@
+"""indicator_value_availability
+
+Revision ID: 7d24e9b1f0a8
+Revises: c81f0e4a9b37
+Create Date: 2026-10-18 14:26:12.774053
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '7d24e9b1f0a8'
+down_revision = 'c81f0e4a9b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'indicator_value_availability',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('indicator_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('territory_id', sa.Integer(), nullable=True),
+        sa.Column('oktmo', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.CheckConstraint("kind IN ('aggregated', 'detailed')"),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ux_indicator_value_availability',
+        'indicator_value_availability',
+        ['indicator_id', 'kind', 'year', 'territory_id', 'oktmo', 'source'],
+        unique=True,
+        postgresql_nulls_not_distinct=True,
+    )
+    op.execute(
+        """
+        INSERT INTO indicator_value_availability (indicator_id, kind, year, territory_id, oktmo, source)
+        SELECT DISTINCT indicator_id, 'aggregated', year, territory_id, oktmo, source
+        FROM aggregated_indicator_values
+        WHERE indicator_id IS NOT NULL
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO indicator_value_availability (indicator_id, kind, year, territory_id, oktmo, source)
+        SELECT DISTINCT indicator_id, 'detailed', year, territory_id, oktmo, source
+        FROM detailed_indicator_values
+        WHERE indicator_id IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_indicator_value_availability', table_name='indicator_value_availability')
+    op.drop_table('indicator_value_availability')
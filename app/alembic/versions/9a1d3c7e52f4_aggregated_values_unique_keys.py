@@ -0,0 +1,66 @@
+"""aggregated_values_unique_keys
+
+Revision ID: 9a1d3c7e52f4
+Revises: 4b8fce1e29e7
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = '9a1d3c7e52f4'
+down_revision = '4b8fce1e29e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep only the most recently inserted value for every key before the unique indexes are built
+    op.execute(
+        """
+        DELETE FROM aggregated_indicator_values
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY indicator_id, oktmo, year ORDER BY id DESC) AS rn
+                FROM aggregated_indicator_values
+                WHERE oktmo IS NOT NULL
+            ) duplicates
+            WHERE rn > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM aggregated_indicator_values
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY indicator_id, territory_id, year ORDER BY id DESC) AS rn
+                FROM aggregated_indicator_values
+                WHERE oktmo IS NULL
+            ) duplicates
+            WHERE rn > 1
+        )
+        """
+    )
+    op.create_index(
+        'ux_aggregated_indicator_values_oktmo',
+        'aggregated_indicator_values',
+        ['indicator_id', 'oktmo', 'year'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NOT NULL'),
+    )
+    op.create_index(
+        'ux_aggregated_indicator_values_territory_id',
+        'aggregated_indicator_values',
+        ['indicator_id', 'territory_id', 'year'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_aggregated_indicator_values_territory_id', table_name='aggregated_indicator_values')
+    op.drop_index('ux_aggregated_indicator_values_oktmo', table_name='aggregated_indicator_values')
@@ -0,0 +1,74 @@
+"""detailed_indicator_pyramids
+
+Revision ID: a6d3f8b1c245
+Revises: e3a91c5d7f20
+Create Date: 2026-10-18 20:12:09.304518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f8b1c245'
+down_revision = 'e3a91c5d7f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'detailed_indicator_pyramids',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('indicator_id', sa.Integer(), nullable=False),
+        sa.Column('territory_id', sa.Integer(), nullable=True),
+        sa.Column('oktmo', sa.Integer(), nullable=True),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('age_start', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('age_end', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('male', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('female', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ux_detailed_indicator_pyramids_oktmo',
+        'detailed_indicator_pyramids',
+        ['indicator_id', 'oktmo', 'year', 'source'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NOT NULL'),
+    )
+    op.create_index(
+        'ux_detailed_indicator_pyramids_territory_id',
+        'detailed_indicator_pyramids',
+        ['indicator_id', 'territory_id', 'year', 'source'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NULL'),
+    )
+    # the loads keep the pyramids in sync from here on, same query as crud.pyramids.rebuild_from_rows
+    op.execute(
+        """
+        INSERT INTO detailed_indicator_pyramids
+            (indicator_id, territory_id, oktmo, year, source, age_start, age_end, male, female)
+        SELECT indicator_id, max(territory_id), oktmo, year, source,
+               array_agg(age_start ORDER BY age_start, age_end IS NULL, age_end),
+               array_agg(age_end ORDER BY age_start, age_end IS NULL, age_end),
+               array_agg(male ORDER BY age_start, age_end IS NULL, age_end),
+               array_agg(female ORDER BY age_start, age_end IS NULL, age_end)
+        FROM detailed_indicator_values
+        WHERE indicator_id IS NOT NULL
+        GROUP BY indicator_id, CASE WHEN oktmo IS NULL THEN territory_id END, oktmo, year, source
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_detailed_indicator_pyramids_territory_id', table_name='detailed_indicator_pyramids')
+    op.drop_index('ux_detailed_indicator_pyramids_oktmo', table_name='detailed_indicator_pyramids')
+    op.drop_table('detailed_indicator_pyramids')
@@ -0,0 +1,79 @@
+"""aggregated_indicator_rollups
+
+Revision ID: b4e7a2c9d150
+Revises: 2f6c8d0e4b93
+Create Date: 2026-10-18 17:32:04.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7a2c9d150'
+down_revision = '2f6c8d0e4b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'aggregated_indicator_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('indicator_id', sa.Integer(), nullable=False),
+        sa.Column('level', sa.String(), nullable=False),
+        sa.Column('oktmo', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('children', sa.Integer(), nullable=False),
+        sa.CheckConstraint("level IN ('district', 'region')"),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ux_aggregated_indicator_rollups',
+        'aggregated_indicator_rollups',
+        ['indicator_id', 'oktmo', 'year'],
+        unique=True,
+        postgresql_include=['level', 'value', 'children'],
+    )
+    # districts from their settlements, then regions from their districts and the settlements
+    # directly in them (district part 000), a district without a value of its own contributes its rollup
+    op.execute(
+        """
+        INSERT INTO aggregated_indicator_rollups (indicator_id, level, oktmo, year, value, children)
+        SELECT indicator_id, 'district', oktmo / 1000 * 1000, year, sum(value), count(*)
+        FROM aggregated_indicator_values
+        WHERE indicator_id IS NOT NULL AND oktmo IS NOT NULL AND oktmo % 1000 != 0 AND oktmo % 1000000 >= 1000
+        GROUP BY indicator_id, oktmo / 1000 * 1000, year
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO aggregated_indicator_rollups (indicator_id, level, oktmo, year, value, children)
+        SELECT indicator_id, 'region', oktmo / 1000000 * 1000000, year, sum(value), count(*)
+        FROM (
+            SELECT indicator_id, oktmo, year, value
+            FROM aggregated_indicator_values
+            WHERE indicator_id IS NOT NULL AND oktmo IS NOT NULL AND oktmo % 1000000 != 0
+                AND (oktmo % 1000 = 0 OR oktmo % 1000000 < 1000)
+            UNION ALL
+            SELECT r.indicator_id, r.oktmo, r.year, r.value
+            FROM aggregated_indicator_rollups r
+            WHERE r.level = 'district' AND NOT EXISTS (
+                SELECT 1 FROM aggregated_indicator_values v
+                WHERE v.indicator_id = r.indicator_id AND v.oktmo = r.oktmo AND v.year = r.year
+            )
+        ) districts
+        GROUP BY indicator_id, oktmo / 1000000 * 1000000, year
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_aggregated_indicator_rollups', table_name='aggregated_indicator_rollups')
+    op.drop_table('aggregated_indicator_rollups')
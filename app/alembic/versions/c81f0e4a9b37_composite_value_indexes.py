@@ -0,0 +1,60 @@
+"""composite_value_indexes
+
+Revision ID: c81f0e4a9b37
+Revises: 5e0b7a8d2c61
+Create Date: 2026-10-18 13:05:47.630914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f0e4a9b37'
+down_revision = '5e0b7a8d2c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_aggregated_indicator_values_indicator_territory_year',
+        'aggregated_indicator_values',
+        ['indicator_id', 'territory_id', 'year'],
+        postgresql_include=['oktmo', 'value', 'source'],
+    )
+    op.create_index(
+        'ix_aggregated_indicator_values_indicator_oktmo_year',
+        'aggregated_indicator_values',
+        ['indicator_id', 'oktmo', 'year'],
+        postgresql_include=['territory_id', 'value', 'source'],
+    )
+    op.create_index(
+        'ix_detailed_indicator_values_indicator_territory_year_age',
+        'detailed_indicator_values',
+        ['indicator_id', 'territory_id', 'year', 'age_start'],
+        postgresql_include=['oktmo', 'age_end', 'source', 'male', 'female'],
+    )
+    op.create_index(
+        'ix_detailed_indicator_values_indicator_oktmo_year_age',
+        'detailed_indicator_values',
+        ['indicator_id', 'oktmo', 'year', 'age_start'],
+        postgresql_include=['territory_id', 'age_end', 'source', 'male', 'female'],
+    )
+    # indicator_id alone is a prefix of the composite indexes
+    op.drop_index('ix_aggregated_indicator_values_indicator_id', table_name='aggregated_indicator_values')
+    op.drop_index('ix_detailed_indicator_values_indicator_id', table_name='detailed_indicator_values')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_detailed_indicator_values_indicator_id', 'detailed_indicator_values', ['indicator_id'], unique=False
+    )
+    op.create_index(
+        'ix_aggregated_indicator_values_indicator_id', 'aggregated_indicator_values', ['indicator_id'], unique=False
+    )
+    op.drop_index('ix_detailed_indicator_values_indicator_oktmo_year_age', table_name='detailed_indicator_values')
+    op.drop_index('ix_detailed_indicator_values_indicator_territory_year_age', table_name='detailed_indicator_values')
+    op.drop_index('ix_aggregated_indicator_values_indicator_oktmo_year', table_name='aggregated_indicator_values')
+    op.drop_index('ix_aggregated_indicator_values_indicator_territory_year', table_name='aggregated_indicator_values')
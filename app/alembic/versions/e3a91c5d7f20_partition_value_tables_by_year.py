@@ -0,0 +1,215 @@
+"""partition value tables by year
+
+Revision ID: e3a91c5d7f20
+Revises: b4e7a2c9d150
+Create Date: 2026-10-18 19:05:41.720316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a91c5d7f20'
+down_revision = 'b4e7a2c9d150'
+branch_labels = None
+depends_on = None
+
+# same range as models.indicator.PARTITION_YEARS, widened to the stored years
+FIRST_YEAR = 1990
+LAST_YEAR = 2050
+
+AGGREGATED_COLUMNS = ['id', 'indicator_id', 'territory_id', 'oktmo', 'year', 'value', 'source']
+DETAILED_COLUMNS = [
+    'id', 'indicator_id', 'territory_id', 'oktmo', 'year', 'source', 'age_start', 'age_end', 'male', 'female'
+]
+
+
+def _aggregated_columns():
+    return [
+        sa.Column(
+            'id',
+            sa.Integer(),
+            server_default=sa.text("nextval('aggregated_indicator_values_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column('indicator_id', sa.Integer(), nullable=True),
+        sa.Column('territory_id', sa.Integer(), nullable=True),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('oktmo', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+    ]
+
+
+def _detailed_columns():
+    return [
+        sa.Column(
+            'id',
+            sa.Integer(),
+            server_default=sa.text("nextval('detailed_indicator_values_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column('indicator_id', sa.Integer(), nullable=True),
+        sa.Column('territory_id', sa.Integer(), nullable=True),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('age_start', sa.Integer(), nullable=True),
+        sa.Column('age_end', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('male', sa.Float(), nullable=True),
+        sa.Column('female', sa.Float(), nullable=True),
+        sa.Column('oktmo', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['indicator_id'],
+            ['indicators.id'],
+        ),
+        sa.CheckConstraint('COALESCE(age_start, age_end) is not null', name='ck_age_start_age_end_not_null'),
+    ]
+
+
+def _create_aggregated_indexes():
+    table = 'aggregated_indicator_values'
+    op.create_index('ix_aggregated_indicator_values_id', table, ['id'])
+    op.create_index('ix_aggregated_indicator_values_territory_id', table, ['territory_id'])
+    op.create_index('ix_aggregated_indicator_values_year', table, ['year'])
+    op.create_index(
+        'ix_aggregated_indicator_values_indicator_territory_year',
+        table,
+        ['indicator_id', 'territory_id', 'year'],
+        postgresql_include=['oktmo', 'value', 'source'],
+    )
+    op.create_index(
+        'ix_aggregated_indicator_values_indicator_oktmo_year',
+        table,
+        ['indicator_id', 'oktmo', 'year'],
+        postgresql_include=['territory_id', 'value', 'source'],
+    )
+    op.create_index(
+        'ux_aggregated_indicator_values_oktmo',
+        table,
+        ['indicator_id', 'oktmo', 'year'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NOT NULL'),
+    )
+    op.create_index(
+        'ux_aggregated_indicator_values_territory_id',
+        table,
+        ['indicator_id', 'territory_id', 'year'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NULL'),
+    )
+
+
+def _create_detailed_indexes():
+    table = 'detailed_indicator_values'
+    op.create_index('ix_detailed_indicator_values_id', table, ['id'])
+    op.create_index('ix_detailed_indicator_values_territory_id', table, ['territory_id'])
+    op.create_index('ix_detailed_indicator_values_year', table, ['year'])
+    op.create_index(
+        'ix_detailed_indicator_values_indicator_territory_year_age',
+        table,
+        ['indicator_id', 'territory_id', 'year', 'age_start'],
+        postgresql_include=['oktmo', 'age_end', 'source', 'male', 'female'],
+    )
+    op.create_index(
+        'ix_detailed_indicator_values_indicator_oktmo_year_age',
+        table,
+        ['indicator_id', 'oktmo', 'year', 'age_start'],
+        postgresql_include=['territory_id', 'age_end', 'source', 'male', 'female'],
+    )
+    op.create_index(
+        'ux_detailed_indicator_values_oktmo',
+        table,
+        ['indicator_id', 'oktmo', 'year', 'source', 'age_start', 'age_end'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NOT NULL'),
+        postgresql_nulls_not_distinct=True,
+    )
+    op.create_index(
+        'ux_detailed_indicator_values_territory_id',
+        table,
+        ['indicator_id', 'territory_id', 'year', 'source', 'age_start', 'age_end'],
+        unique=True,
+        postgresql_where=sa.text('oktmo IS NULL'),
+        postgresql_nulls_not_distinct=True,
+    )
+
+
+INDEXES = {
+    'aggregated_indicator_values': [
+        'ix_aggregated_indicator_values_id',
+        'ix_aggregated_indicator_values_territory_id',
+        'ix_aggregated_indicator_values_year',
+        'ix_aggregated_indicator_values_indicator_territory_year',
+        'ix_aggregated_indicator_values_indicator_oktmo_year',
+        'ux_aggregated_indicator_values_oktmo',
+        'ux_aggregated_indicator_values_territory_id',
+    ],
+    'detailed_indicator_values': [
+        'ix_detailed_indicator_values_id',
+        'ix_detailed_indicator_values_territory_id',
+        'ix_detailed_indicator_values_year',
+        'ix_detailed_indicator_values_indicator_territory_year_age',
+        'ix_detailed_indicator_values_indicator_oktmo_year_age',
+        'ux_detailed_indicator_values_oktmo',
+        'ux_detailed_indicator_values_territory_id',
+    ],
+}
+
+
+def _move_aside(table: str, suffix: str):
+    """Rename the table and free the names of its indexes and primary key for the replacement"""
+    for index in INDEXES[table]:
+        op.drop_index(index, table_name=table)
+    op.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {table}_pkey TO {table}_{suffix}_pkey')
+    op.rename_table(table, f'{table}_{suffix}')
+    # the id sequence stays, the replacement takes it over before the old table is dropped
+    op.execute(f'ALTER TABLE {table}_{suffix} ALTER COLUMN id DROP DEFAULT')
+
+
+def _copy_back(table: str, suffix: str, columns: list[str]):
+    listed = ', '.join(columns)
+    op.execute(f'INSERT INTO {table} ({listed}) SELECT {listed} FROM {table}_{suffix}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.drop_table(f'{table}_{suffix}')
+
+
+def _partition(table: str, columns, create_indexes, copied_columns: list[str]):
+    _move_aside(table, 'unpartitioned')
+    op.create_table(
+        table, *columns(), sa.PrimaryKeyConstraint('id', 'year'), postgresql_partition_by='RANGE (year)'
+    )
+    first_year, last_year = op.get_bind().execute(
+        sa.text(f'SELECT min(year), max(year) FROM {table}_unpartitioned')
+    ).one()
+    for year in range(min(first_year or FIRST_YEAR, FIRST_YEAR), max(last_year or LAST_YEAR, LAST_YEAR) + 1):
+        op.execute(
+            f'CREATE TABLE {table}_y{year} PARTITION OF {table} FOR VALUES FROM ({year}) TO ({year + 1})'
+        )
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    _copy_back(table, 'unpartitioned', copied_columns)
+    # indexes are built once per partition after the copy instead of maintained row by row
+    create_indexes()
+    op.execute(f'ANALYZE {table}')
+
+
+def _unpartition(table: str, columns, create_indexes, copied_columns: list[str]):
+    _move_aside(table, 'partitioned')
+    op.create_table(table, *columns(), sa.PrimaryKeyConstraint('id'))
+    _copy_back(table, 'partitioned', copied_columns)
+    create_indexes()
+
+
+def upgrade() -> None:
+    _partition('aggregated_indicator_values', _aggregated_columns, _create_aggregated_indexes, AGGREGATED_COLUMNS)
+    _partition('detailed_indicator_values', _detailed_columns, _create_detailed_indexes, DETAILED_COLUMNS)
+
+
+def downgrade() -> None:
+    _unpartition('aggregated_indicator_values', _aggregated_columns, _create_aggregated_indexes, AGGREGATED_COLUMNS)
+    _unpartition('detailed_indicator_values', _detailed_columns, _create_detailed_indexes, DETAILED_COLUMNS)
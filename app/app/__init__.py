@@ -1,9 +1,48 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+
+from app.core import metrics
 from app.core.config import settings
+from app.core.jobs import job_queue
+from app.db import warmup
+from app.db.session import engine, read_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the warm-up runs in the background so that /status/ready can report it, see read_readiness
+    app.state.warmup_seconds = None
+
+    async def warm_up():
+        start = time.perf_counter()
+        try:
+            await warmup.warm_up()
+        finally:
+            # a failed warm-up still ends cold, what it missed is set up by the first requests
+            app.state.warmup_seconds = time.perf_counter() - start
+
+    warming_up = asyncio.create_task(warm_up())
+    job_queue.start()
+    yield
+    warming_up.cancel()
+    await asyncio.gather(warming_up, return_exceptions=True)
+    await job_queue.stop()
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
+
 
 app = FastAPI(
     title=settings.project_name,
     #   openapi_url=f"{settings.api_v1_str}/openapi.json",
     version=settings.api_version,
     contact={"name": "Egor Loktev", "url": "https://t.me/eloktev"},
+    lifespan=lifespan,
 )
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine, "primary")
+if read_engine is not None:
+    metrics.instrument_engine(read_engine, "replica")
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud import bulk as bulk_crud
+from app.schemas import indicator as schemas
+from app.db.session import get_db
+
+router = APIRouter()
+
+
+def streamed_body(columns: list[str]) -> dict:
+    return {
+        "requestBody": {
+            "required": True,
+            "description": "CSV with a header row or NDJSON, one value per line, "
+            "every row needs either territory_id or oktmo",
+            "content": {
+                bulk_crud.CSV_CONTENT_TYPE: {"schema": {"type": "string"}, "example": ",".join(columns)},
+                bulk_crud.NDJSON_CONTENT_TYPE: {"schema": {"type": "string"}},
+            },
+        }
+    }
+
+
+@router.post(
+    "/aggregated",
+    response_model=schemas.BulkLoadResponse,
+    openapi_extra=streamed_body(["indicator_id", "territory_id", "oktmo", "year", "value", "source"]),
+)
+async def bulk_load_aggregated_indicator_values(request: Request, db: AsyncSession = Depends(get_db)):
+    return await bulk_crud.load_aggregated_indicator_values(db, request.stream(), request.headers.get("content-type"))
+
+
+@router.post(
+    "/detailed",
+    response_model=schemas.BulkLoadResponse,
+    openapi_extra=streamed_body(
+        ["indicator_id", "territory_id", "oktmo", "year", "source", "age_start", "age_end", "male", "female"]
+    ),
+)
+async def bulk_load_detailed_indicator_values(request: Request, db: AsyncSession = Depends(get_db)):
+    return await bulk_crud.load_detailed_indicator_values(db, request.stream(), request.headers.get("content-type"))
+
+
+@router.put(
+    "/aggregated/years/{year}",
+    response_model=schemas.BulkLoadResponse,
+    openapi_extra=streamed_body(["indicator_id", "territory_id", "oktmo", "year", "value", "source"]),
+)
+async def reload_aggregated_indicator_values_year(year: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Replaces every aggregated value of the year, rows of other years are rejected"""
+    return await bulk_crud.reload_aggregated_year(db, year, request.stream(), request.headers.get("content-type"))
+
+
+@router.put(
+    "/detailed/years/{year}",
+    response_model=schemas.BulkLoadResponse,
+    openapi_extra=streamed_body(
+        ["indicator_id", "territory_id", "oktmo", "year", "source", "age_start", "age_end", "male", "female"]
+    ),
+)
+async def reload_detailed_indicator_values_year(year: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Replaces every detailed value of the year, rows of other years are rejected"""
+    return await bulk_crud.reload_detailed_year(db, year, request.stream(), request.headers.get("content-type"))
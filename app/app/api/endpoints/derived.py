@@ -0,0 +1,67 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.catalog import catalog
+from app.crud import derived as derived_crud
+from app.schemas import indicator as schemas
+from app.db.session import get_db, get_read_db
+
+router = APIRouter()
+
+
+async def _definition_response(db: AsyncSession, definition) -> schemas.DerivedIndicatorResponse:
+    indicator = await catalog.get_indicator(db, definition.indicator_id)
+    return schemas.DerivedIndicatorResponse(
+        id=indicator.id,
+        name=indicator.name,
+        unit_name=indicator.unit_name,
+        expression=definition.expression,
+        variables=definition.variables,
+        materialized=definition.materialized,
+    )
+
+
+async def _get_definition(db: AsyncSession, indicator_id: int):
+    definition = await derived_crud.get_derived_indicator(db, indicator_id)
+    if definition is None:
+        raise HTTPException(404, "Derived indicator not found")
+    return definition
+
+
+@router.post("/", response_model=schemas.DerivedIndicatorResponse)
+async def create_derived_indicator(
+    request: schemas.DerivedIndicatorCreateRequest, db: AsyncSession = Depends(get_db)
+):
+    definition = await derived_crud.create_derived_indicator(db, request)
+    return await _definition_response(db, definition)
+
+
+@router.get("/{indicator_id}", response_model=schemas.DerivedIndicatorResponse)
+async def read_derived_indicator(indicator_id: int, db: AsyncSession = Depends(get_read_db)):
+    return await _definition_response(db, await _get_definition(db, indicator_id))
+
+
+@router.get("/{indicator_id}/values", response_model=list[schemas.DerivedIndicatorValue])
+async def read_derived_indicator_values(
+    indicator_id: int,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    year: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Computes the values on the fly from the current input values, materialized or not"""
+    definition = await _get_definition(db, indicator_id)
+    return await derived_crud.get_derived_indicator_values(db, definition, territory_id, oktmo, year)
+
+
+@router.post("/{indicator_id}/refresh", response_model=schemas.DerivedIndicatorResponse)
+async def refresh_derived_indicator(indicator_id: int, db: AsyncSession = Depends(get_db)):
+    definition = await _get_definition(db, indicator_id)
+    if not definition.materialized:
+        raise HTTPException(400, "DERIVED_INDICATOR_NOT_MATERIALIZED")
+    await derived_crud.refresh_derived_indicator(db, definition)
+    await db.commit()
+    await db.refresh(definition)
+    derived_crud.invalidate_responses([indicator_id])
+    return await _definition_response(db, definition)
@@ -0,0 +1,67 @@
+from typing import AsyncIterator, Callable
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from app.core import columnar
+from app.core.config import settings
+from app.crud import export as export_crud
+from app.db.session import open_read_session, wants_own_writes
+
+router = APIRouter()
+
+
+def _export_response(
+    request: Request,
+    iter_batches: Callable,
+    indicator_ids: list[int],
+    schema,
+    export_format: columnar.ExportFormat,
+    name: str,
+) -> StreamingResponse:
+    read_your_writes = wants_own_writes(request)
+
+    async def body() -> AsyncIterator[bytes]:
+        # the response outlives request dependencies, so the stream owns its session
+        async with await open_read_session(read_your_writes) as db:
+            batches = iter_batches(db, indicator_ids, settings.export_batch_size)
+            async for chunk in columnar.encode(batches, schema, export_format):
+                yield chunk
+
+    extension = "arrows" if export_format == "arrow" else export_format
+    return StreamingResponse(
+        body(),
+        media_type=columnar.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
+
+
+@router.get("/aggregated", response_class=StreamingResponse)
+async def export_aggregated_indicator_values(
+    request: Request,
+    indicator_ids: list[int] = Query(..., min_length=1),
+    export_format: columnar.ExportFormat = Query("arrow", alias="format"),
+):
+    return _export_response(
+        request,
+        export_crud.iter_aggregated_value_batches,
+        indicator_ids,
+        columnar.AGGREGATED_SCHEMA,
+        export_format,
+        "aggregated_indicator_values",
+    )
+
+
+@router.get("/detailed", response_class=StreamingResponse)
+async def export_detailed_indicator_values(
+    request: Request,
+    indicator_ids: list[int] = Query(..., min_length=1),
+    export_format: columnar.ExportFormat = Query("arrow", alias="format"),
+):
+    return _export_response(
+        request,
+        export_crud.iter_detailed_value_batches,
+        indicator_ids,
+        columnar.DETAILED_SCHEMA,
+        export_format,
+        "detailed_indicator_values",
+    )
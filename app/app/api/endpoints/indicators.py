@@ -1,86 +1,172 @@
-from typing import Optional
+from typing import Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.crud import indicator as indicator_crud, unit as unit_crud
+from app.core import gapfill, oktmo as oktmo_codes, pyramid
+from app.core.catalog import catalog
+from app.core.config import settings
+from app.core.pagination import decode_cursor, set_next_cursor
+from app.core.response_cache import AGGREGATED, DETAILED, CacheKey, response_cache
+from app.core.serialization import RowSerializer
+from app.crud import indicator as indicator_crud, rollup as rollup_crud, unit as unit_crud
 from app.schemas import indicator as schemas
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db, on_replica, open_read_session, wants_own_writes
 
 router = APIRouter()
 
+aggregated_values_serializer = RowSerializer(schemas.IndicatorAggregatedResponse)
+filled_values_serializer = RowSerializer(schemas.IndicatorAggregatedFilledResponse)
+detailed_values_serializer = RowSerializer(schemas.IndicatorDetailedResponse)
+
 
 @router.get("/", response_model=list[schemas.IndicatorShortDescriptionResponse])
-async def read_indicators(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
-    indicators = await indicator_crud.get_indicators(db, skip=skip, limit=limit)
-    response = []
-    for indicator in indicators:
-        # unit = await indicator.awaitable_attrs.unit
-        response.append(
-            schemas.IndicatorShortDescriptionResponse(
-                id=indicator.id, name=indicator.name, unit_name=indicator.unit.unit_name
-            )
-        )
-    return response
+async def read_indicators(
+    response: Response,
+    limit: int = Query(10, gt=0, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    order_by: Literal["id", "name"] = "id",
+    name_prefix: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True, description="Use cursor instead"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    indicators = await indicator_crud.get_indicators(
+        db,
+        limit=limit,
+        after=decode_cursor(cursor, order_by, key_types=(str, int) if order_by == "name" else (int,)),
+        order_by=order_by,
+        name_prefix=name_prefix,
+        skip=skip,
+    )
+    set_next_cursor(
+        response, order_by, indicators, limit, key_columns=("name", "id") if order_by == "name" else ("id",)
+    )
+    return [schemas.IndicatorShortDescriptionResponse(**indicator) for indicator in indicators]
 
 
 @router.post("/", response_model=schemas.IndicatorShortDescriptionResponse)
 async def create_indicator(indicator: schemas.IndicatorCreateRequest, db: AsyncSession = Depends(get_db)):
-    unit = await unit_crud.get_unit(db, indicator.unit_id)
+    unit = await catalog.get_unit(db, indicator.unit_id)
     if not unit:
         raise HTTPException(status_code=404, detail=f"Unit with id {indicator.unit_id} not found")
     indicator = await indicator_crud.create_indicator(db=db, indicator=indicator)
-    unit = await indicator.awaitable_attrs.unit
-    response = schemas.IndicatorShortDescriptionResponse(id=indicator.id, name=indicator.name, unit=unit.name)
+    response = schemas.IndicatorShortDescriptionResponse(id=indicator.id, name=indicator.name, unit_name=unit.unit_name)
     return response
 
 
-@router.get("/{indicator_id}")
-async def read_indicator_details(indicator_id: int, db: AsyncSession = Depends(get_db)):
-    indicator = await indicator_crud.get_indicator(db, indicator_id=indicator_id)
+@router.post("/matrix", response_model=schemas.IndicatorMatrixResponse)
+async def read_aggregated_indicator_values_matrix(
+    request: schemas.IndicatorMatrixRequest, db: AsyncSession = Depends(get_read_db)
+):
+    return await indicator_crud.get_aggregated_indicator_values_matrix(db, request)
+
+
+@router.get("/{indicator_id}", response_model=schemas.IndicatorFullDescriptionResponse)
+async def read_indicator_details(
+    indicator_id: int,
+    year: Optional[int] = None,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    indicator = await catalog.get_indicator(db, indicator_id)
     if not indicator:
         raise HTTPException(status_code=404, detail=f"Indicator with id {indicator_id} not found")
 
     aggregated_values_availability = await indicator_crud.get_aggregated_indicator_values_availability(
-        db, indicator_id=indicator_id
+        db, indicator_id=indicator_id, year=year, territory_id=territory_id, oktmo=oktmo
     )
     aggregated_availability_data = [schemas.IndicatorAvailability(**datum) for datum in aggregated_values_availability]
     detailed_values_availability = await indicator_crud.get_detailed_indicator_values_availability(
-        db, indicator_id=indicator_id
+        db, indicator_id=indicator_id, year=year, territory_id=territory_id, oktmo=oktmo
     )
     detailed_availability_data = [schemas.IndicatorAvailability(**datum) for datum in detailed_values_availability]
     response = schemas.IndicatorFullDescriptionResponse(
         id=indicator.id,
         name=indicator.name,
-        unit=indicator.unit.unit_name,
+        unit=indicator.unit_name,
         aggregated_availability=aggregated_availability_data,
         detailed_availability=detailed_availability_data,
     )
     return response
 
 
-@router.get("/{indicator_id}/aggregated", response_model=list[schemas.IndicatorAggregatedResponse])
+@router.get(
+    "/{indicator_id}/aggregated",
+    # the fill variant adds imputed and may leave id empty
+    response_model=Union[list[schemas.IndicatorAggregatedResponse], list[schemas.IndicatorAggregatedFilledResponse]],
+)
 async def read_aggregated_indicator_values(
-        indicator_id: int, territory_id: Optional[int] = None, oktmo: Optional[int] = None, db: AsyncSession = Depends(get_db)
+        request: Request,
+        indicator_id: int,
+        territory_id: Optional[int] = None,
+        oktmo: Optional[int] = None,
+        year: int | None = None,
+        aggregate_to: Optional[oktmo_codes.RollupLevel] = Query(
+            None, description="Sum over the OKTMO district or region containing oktmo"
+        ),
+        fill: Optional[gapfill.FillMethod] = Query(
+            None, description="Fill missing years between observations, every point then carries imputed"
+        ),
+        year_from: Optional[int] = Query(None, description="First year of the filled range"),
+        year_to: Optional[int] = Query(None, description="Last year of the filled range"),
+        db: AsyncSession = Depends(get_read_db)
 ):
-    indicators = await indicator_crud.get_aggregated_indicator_values(
-        db, indicator_id=indicator_id, territory_id=territory_id, oktmo=oktmo
-    )
-    response = []
-    for i in indicators:
-        unit = await i.indicator.awaitable_attrs.unit
-        response.append(
-            schemas.IndicatorAggregatedResponse(
-                id=i.id,
-                indicator_id=i.indicator_id,
-                name=i.indicator.name,
-                unit=unit.unit_name,
-                territory_id=i.territory_id,
-                year=i.year,
-                source=i.source,
-                value=i.value,
+    variant = ",".join(
+        option for option in (aggregate_to, fill and f"{fill}:{year_from}-{year_to}") if option
+    ) or None
+    if aggregate_to and oktmo:
+        # every code inside the parent reads the same rollup
+        key = CacheKey(AGGREGATED, indicator_id, None, oktmo_codes.parent(oktmo, aggregate_to), year, variant)
+    else:
+        key = CacheKey(AGGREGATED, indicator_id, territory_id, oktmo, year, variant)
+    # own writes are neither served from nor left in the cache, nor are replica rows that may predate an invalidation
+    read_your_writes = wants_own_writes(request)
+    cached = None if read_your_writes else response_cache.get(key)
+    generation = response_cache.generation(key)
+    if cached is None:
+        if aggregate_to:
+            indicators = await rollup_crud.get_rollup_values(db, indicator_id, oktmo, aggregate_to, year)
+        else:
+            indicators = await indicator_crud.get_aggregated_indicator_values(
+                db, indicator_id=indicator_id, territory_id=territory_id, oktmo=oktmo, year=year
             )
-        )
-    return response
+        if fill:
+            try:
+                filled = gapfill.fill_rows(indicators, fill, year_from, year_to)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            body = filled_values_serializer.dump_json(filled)
+        else:
+            body = aggregated_values_serializer.dump_json(indicators)
+        if read_your_writes or on_replica(db):
+            cached = response_cache.entry(body)
+        else:
+            cached = response_cache.put(key, body, generation)
+    return response_cache.respond(request, cached)
+
+
+@router.get(
+    "/{indicator_id}/aggregated/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "IndicatorAggregatedResponse per line"}},
+)
+async def stream_aggregated_indicator_values(
+    request: Request, indicator_id: int, year: int | None = None, db: AsyncSession = Depends(get_read_db)
+):
+    if not await catalog.get_indicator(db, indicator_id):
+        raise HTTPException(status_code=404, detail=f"Indicator with id {indicator_id} not found")
+    read_your_writes = wants_own_writes(request)
+
+    async def body():
+        # the response outlives request dependencies, so the stream owns its session
+        async with await open_read_session(read_your_writes) as stream_db:
+            async for rows in indicator_crud.stream_aggregated_indicator_values(
+                stream_db, indicator_id, year, settings.stream_batch_size
+            ):
+                yield aggregated_values_serializer.dump_lines(rows)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 
 @router.post("/{indicator_id}/aggregated", response_model=list[schemas.IndicatorAggregatedResponse])
@@ -104,37 +190,46 @@ async def load_aggregated_indicator_values(
     indicators = await indicator_crud.get_aggregated_indicator_values(
         db, indicator_id=indicator_id, territory_id=territory_id, oktmo=oktmo
     )
-    response = []
-    for i in indicators:
-        unit = await i.indicator.awaitable_attrs.unit
-        response.append(
-            schemas.IndicatorAggregatedResponse(
-                id=i.id,
-                indicator_id=i.indicator_id,
-                name=i.indicator.name,
-                unit=unit.unit_name,
-                territory_id=i.territory_id,
-                oktmo=i.oktmo,
-                year=i.year,
-                source=i.source,
-                value=i.value,
-            )
-        )
-    return response
+    return [schemas.IndicatorAggregatedResponse(**i) for i in indicators]
 
 
 @router.get("/{indicator_id}/{territory_id}/detailed", response_model=list[schemas.IndicatorDetailedResponse])
 async def read_detailed_indicator_values(
+    request: Request,
     indicator_id: int,
         territory_id: Optional[int] = None,
         oktmo: Optional[int] = None,
         year: int | None = None,
-        db: AsyncSession = Depends(get_db)
+        bins: Optional[str] = Query(None, description="Target age bins, e.g. 0-14,15-64,65+"),
+        bin_width: Optional[int] = Query(None, gt=0, description="Uniform target age bins of this width"),
+        db: AsyncSession = Depends(get_read_db)
 ):
-    values = await indicator_crud.get_detailed_indicator_values(db, indicator_id, territory_id, oktmo, year)
-    if values is None:
-        raise HTTPException(status_code=404, detail="Values not found")
-    return values
+    if bins and bin_width:
+        raise HTTPException(status_code=400, detail="BINS_AND_BIN_WIDTH_ARE_EXCLUSIVE")
+    try:
+        target_bins = pyramid.parse_bins(bins) if bins else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    variant = f"bins={bins}" if bins else f"bin_width={bin_width}" if bin_width else None
+    key = CacheKey(DETAILED, indicator_id, territory_id, oktmo, year, variant)
+    read_your_writes = wants_own_writes(request)
+    cached = None if read_your_writes else response_cache.get(key)
+    generation = response_cache.generation(key)
+    if cached is None:
+        values = await indicator_crud.get_detailed_indicator_rows(db, indicator_id, territory_id, oktmo, year)
+        if values is None:
+            raise HTTPException(status_code=404, detail="Values not found")
+        if variant:
+            for value in values:
+                data = [schemas.IndicatorDetailedData.model_validate(band) for band in value["data"]]
+                data = pyramid.rebin(data, target_bins or pyramid.uniform_bins(data, bin_width))
+                value["data"] = [band.model_dump() for band in data]
+        body = detailed_values_serializer.dump_json(values)
+        if read_your_writes or on_replica(db):
+            cached = response_cache.entry(body)
+        else:
+            cached = response_cache.put(key, body, generation)
+    return response_cache.respond(request, cached)
 
 
 @router.post("/{indicator_id}/{territory_id}/detailed", response_model=list[schemas.IndicatorDetailedResponse])
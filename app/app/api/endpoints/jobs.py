@@ -0,0 +1,93 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from app.api.endpoints.bulk import streamed_body
+from app.core.jobs import job_queue, spool, spool_records
+from app.crud import bulk as bulk_crud
+from app.models.indicator import AGGREGATED, DETAILED
+from app.schemas import indicator as indicator_schemas, jobs as schemas
+
+router = APIRouter()
+
+AGGREGATED_COLUMNS = ["indicator_id", "territory_id", "oktmo", "year", "value", "source"]
+DETAILED_COLUMNS = ["indicator_id", "territory_id", "oktmo", "year", "source", "age_start", "age_end", "male", "female"]
+
+
+@router.get("/", response_model=list[schemas.JobResponse])
+async def read_jobs():
+    """Queued, running and recently finished jobs, latest first"""
+    return [job.describe() for job in sorted(job_queue.jobs.values(), key=lambda job: job.submitted_at, reverse=True)]
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+async def read_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.describe()
+
+
+@router.post(
+    "/aggregated", status_code=202, response_model=schemas.JobResponse, openapi_extra=streamed_body(AGGREGATED_COLUMNS)
+)
+async def submit_aggregated_bulk_load(request: Request):
+    """Same body as POST /bulk/aggregated, invalid rows are counted as failed instead of rejecting the load"""
+    content_type = bulk_crud.media_type(request.headers.get("content-type"))
+    return job_queue.submit(AGGREGATED, await spool(request.stream()), content_type).describe()
+
+
+@router.post(
+    "/detailed", status_code=202, response_model=schemas.JobResponse, openapi_extra=streamed_body(DETAILED_COLUMNS)
+)
+async def submit_detailed_bulk_load(request: Request):
+    """Same body as POST /bulk/detailed, invalid rows are counted as failed instead of rejecting the load"""
+    content_type = bulk_crud.media_type(request.headers.get("content-type"))
+    return job_queue.submit(DETAILED, await spool(request.stream()), content_type).describe()
+
+
+@router.post("/indicators/{indicator_id}/aggregated", status_code=202, response_model=schemas.JobResponse)
+async def submit_aggregated_indicator_values(
+    indicator_id: int,
+    indicator_values: list[indicator_schemas.LoadIndicatorAggregatedRequest],
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+):
+    """Same payload as POST /indicators/{indicator_id}/aggregated, loaded in the background"""
+    if not territory_id and not oktmo:
+        raise HTTPException(status_code=400, detail="TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
+    body = await asyncio.to_thread(
+        spool_records,
+        (
+            dict(indicator_id=indicator_id, territory_id=territory_id, oktmo=oktmo, **value.model_dump())
+            for value in indicator_values
+        ),
+    )
+    return job_queue.submit(AGGREGATED, body, bulk_crud.NDJSON_CONTENT_TYPE).describe()
+
+
+@router.post("/indicators/{indicator_id}/detailed", status_code=202, response_model=schemas.JobResponse)
+async def submit_detailed_indicator_values(
+    indicator_id: int,
+    request: indicator_schemas.LoadIndicatorDetailedRequest,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+):
+    """Same payload as POST /indicators/{indicator_id}/{territory_id}/detailed, loaded in the background"""
+    if not territory_id and not oktmo:
+        raise HTTPException(status_code=400, detail="TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
+    body = await asyncio.to_thread(
+        spool_records,
+        (
+            dict(
+                indicator_id=indicator_id,
+                territory_id=territory_id,
+                oktmo=oktmo,
+                year=request.year,
+                source=request.source,
+                **band.model_dump(),
+            )
+            for band in request.data
+        ),
+    )
+    return job_queue.submit(DETAILED, body, bulk_crud.NDJSON_CONTENT_TYPE).describe()
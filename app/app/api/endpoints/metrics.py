@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.core import metrics
+
+router = APIRouter()
+
+
+@router.get("", response_class=Response)
+async def read_metrics():
+    """Prometheus text exposition of the request, SQL and ingestion metrics"""
+    return Response(generate_latest(metrics.registry), media_type=CONTENT_TYPE_LATEST)
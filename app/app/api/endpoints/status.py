@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from app.db.session import engine, read_engine
+from app.schemas import status as schemas
+
+router = APIRouter()
+
+
+@router.get("/pool", response_model=schemas.PoolStatsResponse)
+async def read_pool_stats():
+    return engine.pool.stats()
+
+
+@router.get("/pool/replica", response_model=schemas.PoolStatsResponse)
+async def read_replica_pool_stats():
+    if read_engine is None:
+        raise HTTPException(status_code=404, detail="Read replica is not configured")
+    return read_engine.pool.stats()
+
+
+@router.get(
+    "/ready",
+    response_model=schemas.ReadinessResponse,
+    responses={503: {"model": schemas.ReadinessResponse, "description": "Startup warm-up still running"}},
+)
+async def read_readiness(request: Request, response: Response):
+    """Ready once the startup warm-up finished, the service answers before that but cold"""
+    ready = request.app.state.warmup_seconds is not None
+    if not ready:
+        response.status_code = 503
+    return schemas.ReadinessResponse(ready=ready, warmup_seconds=request.app.state.warmup_seconds)
@@ -1,21 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.catalog import catalog
+from app.core.pagination import decode_cursor, set_next_cursor
 from app.crud import unit as crud
 from app.schemas.unit import UnitCreateRequest, UnitResponse
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 
 router = APIRouter()
 
 
 @router.get("/{unit_id}", response_model=UnitResponse)
-async def read_unit(unit_id: int, db: AsyncSession = Depends(get_db)):
-    unit = await crud.get_unit(db, unit_id=unit_id)
+async def read_unit(unit_id: int, db: AsyncSession = Depends(get_read_db)):
+    unit = await catalog.get_unit(db, unit_id)
+    if not unit:
+        raise HTTPException(status_code=404, detail=f"Unit with id {unit_id} not found")
     return unit
 
 
 @router.get("/", response_model=list[UnitResponse])
-async def read_units(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
-    units = await crud.get_units(db, skip=skip, limit=limit)
+async def read_units(
+    response: Response,
+    limit: int = Query(10, gt=0, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    order_by: Literal["id", "unit_name"] = "id",
+    name_prefix: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True, description="Use cursor instead"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    after = decode_cursor(cursor, order_by, key_types=(str, int) if order_by == "unit_name" else (int,))
+    units = await crud.get_units(db, limit=limit, after=after, order_by=order_by, name_prefix=name_prefix, skip=skip)
+    set_next_cursor(
+        response,
+        order_by,
+        [{"id": unit.id, "unit_name": unit.unit_name} for unit in units],
+        limit,
+        key_columns=("unit_name", "id") if order_by == "unit_name" else ("id",),
+    )
     return units
 
 
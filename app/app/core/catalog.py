@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import indicator as indicator_models, unit as unit_models
+from app.schemas.indicator import IndicatorShortDescriptionResponse
+from app.schemas.unit import UnitResponse
+
+
+class CatalogCache:
+    """In-process cache of the units and indicators catalog.
+
+    Misses for the same key are loaded once, concurrent requests wait for the
+    first one. Entries are dropped by the create_* CRUD functions and expire
+    after a TTL so writes made by other processes show up eventually.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.units = TTLCache(maxsize, ttl)
+        self.indicators = TTLCache(maxsize, ttl)
+        self._loading: dict[Hashable, asyncio.Lock] = {}
+        # requests holding or waiting for each lock, it is dropped with the last one
+        self._waiters: dict[Hashable, int] = {}
+
+    async def get_unit(self, db: AsyncSession, unit_id: int) -> Optional[UnitResponse]:
+        async def load():
+            result = await db.execute(
+                select(unit_models.Unit.id, unit_models.Unit.unit_name).where(unit_models.Unit.id == unit_id)
+            )
+            row = result.first()
+            return UnitResponse(id=row.id, unit_name=row.unit_name) if row else None
+
+        return await self._get(self.units, unit_id, load)
+
+    async def get_indicator(self, db: AsyncSession, indicator_id: int) -> Optional[IndicatorShortDescriptionResponse]:
+        async def load():
+            result = await db.execute(self._indicators_query().where(indicator_models.Indicator.id == indicator_id))
+            row = result.first()
+            return IndicatorShortDescriptionResponse(**row._mapping) if row else None
+
+        return await self._get(self.indicators, indicator_id, load)
+
+    def invalidate_unit(self, unit_id: int):
+        self.units.pop(unit_id)
+
+    def invalidate_indicator(self, indicator_id: int):
+        self.indicators.pop(indicator_id)
+
+    async def preload(self, db: AsyncSession):
+        units = await db.execute(
+            select(unit_models.Unit.id, unit_models.Unit.unit_name).limit(self.units.maxsize)
+        )
+        for row in units:
+            self.units.set(row.id, UnitResponse(id=row.id, unit_name=row.unit_name))
+        indicators = await db.execute(self._indicators_query().limit(self.indicators.maxsize))
+        for row in indicators:
+            self.indicators.set(row.id, IndicatorShortDescriptionResponse(**row._mapping))
+
+    @staticmethod
+    def _indicators_query():
+        return select(
+            indicator_models.Indicator.id, indicator_models.Indicator.name, unit_models.Unit.unit_name
+        ).join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+
+    async def _get(self, cache: TTLCache, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        value = cache.get(key)
+        if value is not None:
+            return value
+        loading_key = (id(cache), key)
+        lock = self._loading.setdefault(loading_key, asyncio.Lock())
+        self._waiters[loading_key] = self._waiters.get(loading_key, 0) + 1
+        try:
+            async with lock:
+                value = cache.get(key)
+                if value is None:
+                    value = await load()
+                    if value is not None:
+                        cache.set(key, value)
+                return value
+        finally:
+            self._waiters[loading_key] -= 1
+            if not self._waiters[loading_key]:
+                del self._waiters[loading_key]
+                del self._loading[loading_key]
+
+
+catalog = CatalogCache(maxsize=settings.catalog_cache_size, ttl=settings.catalog_cache_ttl)
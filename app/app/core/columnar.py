@@ -0,0 +1,81 @@
+import io
+from typing import AsyncIterator, Literal
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.ipc
+import pyarrow.parquet
+
+ExportFormat = Literal["arrow", "parquet", "csv"]
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv",
+}
+
+AGGREGATED_SCHEMA = pa.schema(
+    [
+        ("id", pa.int32()),
+        ("indicator_id", pa.int32()),
+        ("territory_id", pa.int32()),
+        ("oktmo", pa.int32()),
+        ("year", pa.int32()),
+        ("value", pa.float64()),
+        ("source", pa.string()),
+    ]
+)
+
+DETAILED_SCHEMA = pa.schema(
+    [
+        ("id", pa.int32()),
+        ("indicator_id", pa.int32()),
+        ("territory_id", pa.int32()),
+        ("oktmo", pa.int32()),
+        ("year", pa.int32()),
+        ("source", pa.string()),
+        ("age_start", pa.int32()),
+        ("age_end", pa.int32()),
+        ("male", pa.float64()),
+        ("female", pa.float64()),
+    ]
+)
+
+
+def record_batch(rows: list[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    """Builds a batch from database rows whose columns follow the schema order"""
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+async def encode(
+    batches: AsyncIterator[pa.RecordBatch], schema: pa.Schema, export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """Writes the batches in the requested format, yielding the encoded bytes after every batch"""
+    sink = io.BytesIO()
+    if export_format == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    elif export_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.csv.CSVWriter(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    try:
+        async for batch in batches:
+            writer.write_batch(batch)
+            data = drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = drain()
+    if data:
+        yield data
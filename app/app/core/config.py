@@ -1,10 +1,45 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str
+    # read-only replica for the GET endpoints, reads go to the primary when unset
+    read_database_url: Optional[str] = None
+    # seconds reads stay on the primary after the replica failed to connect
+    read_replica_retry_after: float = 30.0
     project_name: str
     api_version: str
+    catalog_cache_ttl: float = 300.0
+    catalog_cache_size: int = 10000
+    response_cache_ttl: float = 300.0
+    response_cache_size: int = 10000
+    export_batch_size: int = 50000
+    stream_batch_size: int = 1000
+    # where the detailed GET reads pyramids: one row per age band or one row of arrays per pyramid,
+    # the loads refresh the arrays only when they are read, run app.db.rebuild_pyramids before switching to arrays
+    detailed_storage: Literal["rows", "arrays"] = "rows"
+    # encode the value reads straight from query rows with orjson instead of validating them through the schemas
+    fast_json: bool = False
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    # prepared statements kept per connection by asyncpg, 0 disables the cache (e.g. behind pgbouncer)
+    db_statement_cache_size: int = 100
+    # pooled connections opened with the hot statements prepared at startup, before the service reports ready
+    db_warmup_connections: int = 5
+    # background bulk loads running at once, each holds a pooled connection while it runs
+    ingestion_workers: int = 2
+    # jobs waiting for a worker, further submissions are refused
+    ingestion_queue_size: int = 100
+    # seconds finished jobs stay visible to the status endpoint
+    ingestion_job_retention: float = 3600.0
+    # bytes of a submitted body kept in memory, larger bodies are spooled to a temporary file
+    ingestion_spool_size: int = 8 * 1024 * 1024
 
     class Config:
         env_file = ".env"
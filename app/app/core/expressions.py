@@ -0,0 +1,88 @@
+import ast
+import re
+from typing import Iterable, Mapping
+
+from sqlalchemy import Float, func, literal
+from sqlalchemy.sql.elements import ColumnElement
+
+_VARIABLE_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# to_sql recurses once per level, deeper expressions are refused instead of overflowing the stack
+MAX_DEPTH = 100
+
+_OPERATORS = {
+    ast.Add: lambda left, right: left + right,
+    ast.Sub: lambda left, right: left - right,
+    ast.Mult: lambda left, right: left * right,
+    # a zero denominator gives NULL instead of failing the whole statement
+    ast.Div: lambda left, right: left / func.nullif(right, literal(0.0, Float), type_=Float),
+}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def parse(expression: str, variables: Iterable[str]) -> ast.Expression:
+    """Parses an arithmetic expression over the given variables, e.g. 'beds / population * 1000'.
+
+    Only numbers, variables, + - * / and parentheses are allowed.
+    """
+    variables = set(variables)
+    for variable in variables:
+        if not _VARIABLE_PATTERN.match(variable):
+            raise ExpressionError(f"Invalid variable name {variable!r}")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise ExpressionError("Expression is nested too deeply")
+    if _depth(tree) > MAX_DEPTH:
+        raise ExpressionError("Expression is nested too deeply")
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in variables:
+                raise ExpressionError(f"Unknown variable {node.id!r}")
+            used.add(node.id)
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported constant {node.value!r}")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in _OPERATORS:
+                raise ExpressionError("Only + - * / operators are supported")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.UAdd, ast.USub)):
+                raise ExpressionError("Only + - unary operators are supported")
+        elif not isinstance(node, (ast.Expression, ast.Load, ast.operator, ast.unaryop)):
+            raise ExpressionError(f"Unsupported syntax {type(node).__name__}")
+    if used != variables:
+        raise ExpressionError(f"Unused variables: {', '.join(sorted(variables - used))}")
+    return tree
+
+
+def _depth(tree: ast.AST) -> int:
+    depth, stack = 0, [(tree, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in ast.iter_child_nodes(node))
+    return depth
+
+
+def to_sql(tree: ast.Expression, columns: Mapping[str, ColumnElement]) -> ColumnElement:
+    """Compiles a parsed expression to SQL over the columns bound to its variables"""
+
+    def compile_node(node: ast.AST) -> ColumnElement:
+        if isinstance(node, ast.Expression):
+            return compile_node(node.body)
+        if isinstance(node, ast.Name):
+            return columns[node.id]
+        if isinstance(node, ast.Constant):
+            return literal(float(node.value), Float)
+        if isinstance(node, ast.UnaryOp):
+            operand = compile_node(node.operand)
+            return -operand if isinstance(node.op, ast.USub) else operand
+        return _OPERATORS[type(node.op)](compile_node(node.left), compile_node(node.right))
+
+    return compile_node(tree)
@@ -0,0 +1,84 @@
+from typing import Literal, Optional
+
+import numpy as np
+
+FillMethod = Literal["linear", "step"]
+
+IMPUTED_SOURCE = "imputed"
+
+# (series, years) cells of one fill, the array is allocated in full before filling
+FILL_MAX_CELLS = 10_000_000
+
+
+def fill(values: np.ndarray, method: FillMethod) -> tuple[np.ndarray, np.ndarray]:
+    """Fills the NaN holes of every row of a (series, years) array at once.
+
+    Linear interpolates between the neighbouring observations, step carries
+    the previous observation forward. Years before the first or after the
+    last observation of a series are not extrapolated and stay NaN.
+    Returns the filled array and the mask of imputed cells.
+    """
+    observed = ~np.isnan(values)
+    years = values.shape[1]
+    positions = np.broadcast_to(np.arange(years), values.shape)
+    previous = np.maximum.accumulate(np.where(observed, positions, -1), axis=1)
+    following = np.minimum.accumulate(np.where(observed, positions, years)[:, ::-1], axis=1)[:, ::-1]
+    imputed = ~observed & (previous >= 0) & (following < years)
+
+    rows = np.arange(values.shape[0])[:, None]
+    previous_values = values[rows, np.clip(previous, 0, years - 1)]
+    if method == "step":
+        estimates = previous_values
+    else:
+        following_values = values[rows, np.clip(following, 0, years - 1)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weights = (positions - previous) / (following - previous)
+        estimates = previous_values + (following_values - previous_values) * weights
+    return np.where(imputed, estimates, values), imputed
+
+
+def fill_rows(
+    rows: list[dict],
+    method: FillMethod,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+) -> list[dict]:
+    """Completes rows shaped as IndicatorAggregatedResponse to one row per year for every (territory_id, oktmo).
+
+    The year range defaults to the years observed in any of the series.
+    Every row gets imputed, the added ones have no id and source 'imputed'.
+    Raises ValueError when the range times the series exceeds FILL_MAX_CELLS.
+    """
+    if not rows:
+        return []
+    year_from = min(row["year"] for row in rows) if year_from is None else year_from
+    year_to = max(row["year"] for row in rows) if year_to is None else year_to
+    if year_to < year_from:
+        return []
+    series = list(dict.fromkeys((row["territory_id"], row["oktmo"]) for row in rows))
+    if len(series) * (year_to - year_from + 1) > FILL_MAX_CELLS:
+        raise ValueError("FILL_RANGE_TOO_LARGE")
+    series_positions = {key: i for i, key in enumerate(series)}
+    values = np.full((len(series), year_to - year_from + 1), np.nan)
+    templates: dict[tuple, dict] = {}
+    observed: dict[tuple, dict] = {}
+    for row in rows:
+        key = (row["territory_id"], row["oktmo"])
+        templates.setdefault(key, row)
+        if year_from <= row["year"] <= year_to:
+            values[series_positions[key], row["year"] - year_from] = row["value"]
+            observed[(key, row["year"])] = row
+    filled, imputed = fill(values, method)
+
+    result = []
+    for key, i in series_positions.items():
+        for j in np.flatnonzero(~np.isnan(filled[i])):
+            year = year_from + int(j)
+            if imputed[i, j]:
+                row = {**templates[key], "id": None, "year": year, "source": IMPUTED_SOURCE}
+                row["value"] = float(filled[i, j])
+            else:
+                row = dict(observed[(key, year)])
+            row["imputed"] = bool(imputed[i, j])
+            result.append(row)
+    return result
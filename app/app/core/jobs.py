@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException
+
+from app.core import metrics
+from app.core.config import settings
+from app.crud import bulk as bulk_crud
+from app.db.session import SessionLocal
+from app.models.indicator import AGGREGATED, DETAILED
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+CHUNK_SIZE = 64 * 1024
+
+LOADS = {
+    AGGREGATED: bulk_crud.load_aggregated_indicator_values,
+    DETAILED: bulk_crud.load_detailed_indicator_values,
+}
+
+
+async def spool(chunks: AsyncIterator[bytes]) -> tempfile.SpooledTemporaryFile:
+    """Reads a request body to the end, so that the request can be answered before the load runs.
+
+    Past ingestion_spool_size the body is written to disk, so the writes run in a thread.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=settings.ingestion_spool_size)
+    async for chunk in chunks:
+        await asyncio.to_thread(body.write, chunk)
+    body.seek(0)
+    return body
+
+
+def spool_records(records: Iterable[dict]) -> tempfile.SpooledTemporaryFile:
+    """NDJSON body of the given bulk rows, may write to disk so it is run in a thread"""
+    body = tempfile.SpooledTemporaryFile(max_size=settings.ingestion_spool_size)
+    for record in records:
+        body.write(orjson.dumps(record) + b"\n")
+    body.seek(0)
+    return body
+
+
+class Job:
+    """A bulk load waiting for or running on a worker, its counters are read while it runs"""
+
+    def __init__(self, kind: str, body: tempfile.SpooledTemporaryFile, content_type: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.body = body
+        self.content_type = content_type
+        self.status = QUEUED
+        self.progress = bulk_crud.LoadProgress()
+        self.rows_merged: Optional[int] = None
+        self.error: Optional[str] = None
+        self.submitted_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while chunk := await asyncio.to_thread(self.body.read, CHUNK_SIZE):
+            yield chunk
+
+    def fail(self, error: str):
+        self.status = FAILED
+        self.error = error
+        # the load runs in a single transaction, nothing of a failed job is written
+        self.progress.rows_failed = self.progress.rows_processed
+
+    def describe(self) -> dict:
+        throughput = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.now(timezone.utc)) - self.started_at).total_seconds()
+            throughput = self.progress.rows_processed / elapsed if elapsed > 0 else None
+        return dict(
+            id=self.id,
+            kind=self.kind,
+            status=self.status,
+            submitted_at=self.submitted_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            rows_processed=self.progress.rows_processed,
+            rows_failed=self.progress.rows_failed,
+            rows_merged=self.rows_merged,
+            throughput=throughput,
+            error=self.error,
+        )
+
+
+class JobQueue:
+    """Bulk loads run in the background by a fixed number of in-process workers.
+
+    Every worker loads through its own session, so ingestion holds at most
+    `workers` pooled connections however many jobs are submitted. Jobs live in
+    memory only: queued and running jobs are lost when the process stops.
+    """
+
+    def __init__(self, workers: int, maxsize: int, retention: float):
+        self.workers = workers
+        self.retention = retention
+        self.jobs: dict[str, Job] = {}
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize)
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, body: tempfile.SpooledTemporaryFile, content_type: str) -> Job:
+        self._expire()
+        job = Job(kind, body, content_type)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            body.close()
+            raise HTTPException(503, "JOB_QUEUE_FULL")
+        self.jobs[job.id] = job
+        metrics.ingestion_jobs.labels(status=QUEUED).inc()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self.jobs.get(job_id)
+
+    def _expire(self):
+        now = datetime.now(timezone.utc)
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and (now - job.finished_at).total_seconds() > self.retention:
+                del self.jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        metrics.ingestion_jobs.labels(status=QUEUED).dec()
+        metrics.ingestion_jobs.labels(status=RUNNING).inc()
+        job.status = RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            async with SessionLocal() as db:
+                result = await LOADS[job.kind](db, job.chunks(), job.content_type, job.progress)
+        except HTTPException as e:
+            job.fail(str(e.detail))
+        except asyncio.CancelledError:
+            job.fail("CANCELLED")
+            raise
+        except Exception as e:
+            logger.exception("Ingestion job %s failed", job.id)
+            job.fail(str(e))
+        else:
+            job.status = SUCCEEDED
+            job.rows_merged = result["rows_merged"]
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job.body.close()
+            metrics.ingestion_jobs.labels(status=RUNNING).dec()
+
+
+job_queue = JobQueue(settings.ingestion_workers, settings.ingestion_queue_size, settings.ingestion_job_retention)
@@ -0,0 +1,111 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+# a registry of our own, so /metrics does not export the process and platform collectors
+registry = CollectorRegistry()
+
+requests_in_progress = Gauge("http_requests_in_progress", "Requests being served", registry=registry)
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency until the last body chunk is sent",
+    ("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+request_statements = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ("method", "route"),
+    buckets=STATEMENT_BUCKETS,
+    registry=registry,
+)
+request_sql_duration = Histogram(
+    "http_request_sql_seconds",
+    "SQL execution time per request",
+    ("method", "route"),
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+statements = Counter("sql_statements", "SQL statements executed", ("engine",), registry=registry)
+statement_duration = Counter("sql_seconds", "SQL execution time", ("engine",), registry=registry)
+rows_ingested = Counter("ingested_rows", "Value rows written by the loads", ("kind", "path"), registry=registry)
+ingestion_jobs = Gauge("ingestion_jobs", "Ingestion jobs queued or running", ("status",), registry=registry)
+
+
+class RequestSql:
+    """SQL executed on behalf of the current request"""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# set by MetricsMiddleware, the engine events add to it; SQLAlchemy runs the
+# driver calls in greenlets that share the context of the awaiting task
+current_request_sql: ContextVar[Optional[RequestSql]] = ContextVar("current_request_sql", default=None)
+
+
+def instrument_engine(engine, name: str):
+    """Counts the statements of an (async) engine and attributes them to the current request"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        statements.labels(engine=name).inc()
+        statement_duration.labels(engine=name).inc(elapsed)
+        request_sql = current_request_sql.get()
+        if request_sql is not None:
+            request_sql.statements += 1
+            request_sql.seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and SQL per route.
+
+    Requests are labelled with the route template, e.g.
+    /indicators/{indicator_id}/aggregated, so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_sql = RequestSql()
+        token = current_request_sql.set(request_sql)
+        requests_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_progress.dec()
+            current_request_sql.reset(token)
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_duration.labels(method=method, route=route, status=status).observe(elapsed)
+            request_statements.labels(method=method, route=route).observe(request_sql.statements)
+            request_sql_duration.labels(method=method, route=route).observe(request_sql.seconds)
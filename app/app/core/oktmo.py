@@ -0,0 +1,46 @@
+from typing import Literal
+
+# OKTMO municipality codes are 8 digits XX YYY ZZZ: region, municipal district
+# or urban okrug, settlement. A code ending in zeros names the enclosing level,
+# e.g. 45 000 000 is a region and 45 301 000 a district in it.
+DISTRICT = "district"
+REGION = "region"
+RollupLevel = Literal["district", "region"]
+
+# bottom-up, a region is rolled up from its districts
+LEVELS = (DISTRICT, REGION)
+
+_SPANS = {DISTRICT: 1_000, REGION: 1_000_000}
+
+
+def span(level: str) -> int:
+    """Number of codes covered by one parent of the level"""
+    return _SPANS[level]
+
+
+def parent(oktmo, level: str):
+    """Code of the enclosing district or region, works on ints and SQL expressions alike"""
+    return oktmo // _SPANS[level] * _SPANS[level]
+
+
+def is_below(oktmo, level: str):
+    """Whether the code names a territory strictly inside a parent of the level.
+
+    A settlement directly in a region has district part 000 and is inside no district.
+    """
+    below = oktmo % _SPANS[level] != 0
+    if level == DISTRICT:
+        return below & (oktmo % _SPANS[REGION] >= _SPANS[DISTRICT])
+    return below
+
+
+def is_child(oktmo, level: str):
+    """Whether the code names a direct child of a parent of the level.
+
+    Districts are made of settlements, regions of districts and of the
+    settlements directly in them.
+    """
+    if level == DISTRICT:
+        return is_below(oktmo, DISTRICT)
+    outside_districts = (oktmo % _SPANS[DISTRICT] == 0) | (oktmo % _SPANS[REGION] < _SPANS[DISTRICT])
+    return outside_districts & is_below(oktmo, REGION)
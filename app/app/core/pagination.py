@@ -0,0 +1,43 @@
+import base64
+import json
+from typing import Any, Optional
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(order_by: str, key: list[Any]) -> str:
+    payload = json.dumps([order_by, key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], order_by: str, key_types: tuple[type, ...]) -> Optional[list[Any]]:
+    """Returns the sort key of the last row of the previous page, key_types are the types of its columns"""
+    if cursor is None:
+        return None
+    try:
+        cursor_order_by, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "INVALID_CURSOR")
+    if cursor_order_by != order_by:
+        raise HTTPException(400, "CURSOR_ORDER_MISMATCH")
+    if not _is_key(key, key_types):
+        raise HTTPException(400, "INVALID_CURSOR")
+    return key
+
+
+def _is_key(key: Any, key_types: tuple[type, ...]) -> bool:
+    # bool is an int subclass but never a sort key
+    return (
+        isinstance(key, list)
+        and len(key) == len(key_types)
+        and all(isinstance(item, key_type) and not isinstance(item, bool) for item, key_type in zip(key, key_types))
+    )
+
+
+def set_next_cursor(response: Response, order_by: str, rows: list, limit: int, key_columns: tuple[str, ...]):
+    """A full page may be followed by another one, its cursor is sent in the X-Next-Cursor header"""
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(order_by, [last[column] for column in key_columns])
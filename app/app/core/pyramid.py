@@ -0,0 +1,101 @@
+import re
+from typing import Optional
+
+import numpy as np
+
+from app.schemas.indicator import IndicatorDetailedData
+
+# Open-ended bands (age_end is None) are spread up to this age when they have to be split
+MAX_AGE = 100
+
+AgeBin = tuple[int, Optional[int]]
+
+_BIN_PATTERN = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)|(\+))\s*$")
+
+
+def parse_bins(spec: str) -> list[AgeBin]:
+    """Parses a bin specification like '0-14,15-64,65+' into inclusive (age_start, age_end) pairs sorted by age.
+
+    Overlapping bins would count the same people twice and are rejected.
+    """
+    bins = []
+    for part in spec.split(","):
+        match = _BIN_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"Invalid age bin {part!r}")
+        start = int(match.group(1))
+        end = None if match.group(3) else int(match.group(2))
+        if end is not None and end < start:
+            raise ValueError(f"Invalid age bin {part!r}")
+        bins.append((start, end))
+    bins.sort(key=lambda age_bin: age_bin[0])
+    for previous, current in zip(bins, bins[1:]):
+        if previous[1] is None or current[0] <= previous[1]:
+            raise ValueError(f"Overlapping age bins {_format(*previous)} and {_format(*current)}")
+    return bins
+
+
+def _format(start: int, end: Optional[int]) -> str:
+    return f"{start}+" if end is None else f"{start}-{end}"
+
+
+def uniform_bins(data: list[IndicatorDetailedData], width: int) -> list[AgeBin]:
+    """Bins of the given width from age 0, the open-ended band of the data (if any) stays open-ended.
+
+    The open bin starts at the open-ended band rounded down to the bin width, so
+    that band never has to be split.
+    """
+    if width <= 0:
+        raise ValueError("Bin width must be positive")
+    open_starts = [datum.age_start for datum in data if datum.age_end is None]
+    if open_starts:
+        top = min(open_starts) // width * width
+    else:
+        top = max((datum.age_end for datum in data), default=-1) + 1
+    bins: list[AgeBin] = [(start, start + width - 1) for start in range(0, top, width)]
+    if open_starts:
+        bins.append((top, None))
+    return bins
+
+
+def rebin(data: list[IndicatorDetailedData], bins: list[AgeBin]) -> list[IndicatorDetailedData]:
+    """Redistributes male and female counts of the source bands over the target bins.
+
+    A source band contributes to a bin in proportion to the share of its years
+    that fall into the bin, i.e. counts are assumed to be uniform within a band.
+    A bin gets None for a sex when none of its contributing bands has a value.
+    """
+    if not data or not bins:
+        return []
+    source_start = np.array([datum.age_start for datum in data], dtype=float)
+    source_end = np.array(
+        [MAX_AGE + 1 if datum.age_end is None else datum.age_end + 1 for datum in data], dtype=float
+    )
+    source_end = np.maximum(source_end, source_start + 1)
+    target_start = np.array([start for start, _ in bins], dtype=float)
+    target_end = np.array([np.inf if end is None else end + 1 for _, end in bins], dtype=float)
+
+    overlap = np.clip(
+        np.minimum(source_end[:, None], target_end[None, :]) - np.maximum(source_start[:, None], target_start[None, :]),
+        0,
+        None,
+    )
+    weights = overlap / (source_end - source_start)[:, None]
+
+    results = []
+    for sex in ("male", "female"):
+        values = np.array([np.nan if getattr(datum, sex) is None else getattr(datum, sex) for datum in data])
+        known = ~np.isnan(values)
+        totals = np.nan_to_num(values) @ weights
+        covered = (weights[known] > 0).any(axis=0)
+        results.append(np.where(covered, totals, np.nan))
+
+    return [
+        IndicatorDetailedData(
+            age_start=start,
+            age_end=end,
+            male=None if np.isnan(male) else float(male),
+            female=None if np.isnan(female) else float(female),
+        )
+        for (start, end), male, female in zip(bins, *results)
+    ]
@@ -0,0 +1,95 @@
+import hashlib
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.indicator import AGGREGATED, DETAILED
+
+
+class CacheKey(NamedTuple):
+    kind: str
+    indicator_id: int
+    territory_id: Optional[int]
+    oktmo: Optional[int]
+    year: Optional[int]
+    # representation options of the same values, e.g. age bins, ignored by invalidation
+    variant: Optional[str] = None
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """Serialized JSON bodies of the value reads.
+
+    Entries are dropped by the value loads right after they commit, the TTL
+    only bounds staleness for writes made by other processes. A read takes the
+    generation of its indicator before querying and its body is only stored if
+    no invalidation happened in between, so a read that raced a load does not
+    put the values from before the load back.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize, ttl)
+        self.generations: defaultdict[tuple[str, int], int] = defaultdict(int)
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        return self.entries.get(key)
+
+    def generation(self, key: CacheKey) -> int:
+        return self.generations.get((key.kind, key.indicator_id), 0)
+
+    @staticmethod
+    def entry(body: bytes) -> CachedResponse:
+        """A response with validators that is not stored, for bodies that must not be cached"""
+        return CachedResponse(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+    def put(self, key: CacheKey, body: bytes, generation: int) -> CachedResponse:
+        """Stores the body read at the given generation, unless the indicator was invalidated since"""
+        cached = self.entry(body)
+        if self.generation(key) == generation:
+            self.entries.set(key, cached)
+        return cached
+
+    def invalidate(
+        self, kind: str, indicator_id: int, territory_id: Optional[int] = None, oktmo: Optional[int] = None
+    ):
+        """Drop the reads of an indicator that may include the written values.
+
+        Reads by oktmo are matched by oktmo and reads by territory_id by
+        territory_id, without either every read of the indicator is dropped.
+        """
+        self.generations[kind, indicator_id] += 1
+        for key in self.entries:
+            if key.kind != kind or key.indicator_id != indicator_id:
+                continue
+            if territory_id is None and oktmo is None:
+                self.entries.pop(key)
+            elif key.oktmo is not None and key.oktmo == oktmo:
+                self.entries.pop(key)
+            elif key.oktmo is None and key.territory_id == territory_id:
+                self.entries.pop(key)
+
+    @staticmethod
+    def respond(request: Request, cached: CachedResponse) -> Response:
+        # the rows carry no modification time, so the ETag is the only validator
+        headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+        if _not_modified(request, cached):
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+def _not_modified(request: Request, cached: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        return "*" in etags or cached.etag in etags
+    return False
+
+
+response_cache = ResponseCache(maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl)
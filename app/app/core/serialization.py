@@ -0,0 +1,37 @@
+"""JSON bodies of the value reads, built from plain query rows.
+
+By default the rows are validated through the response schemas before they
+are dumped. With FAST_JSON the rows are only projected on the schema fields
+and written by orjson, so they must already carry the schema types, which
+the CRUD queries guarantee. Either way the body has the same schema.
+"""
+from typing import Iterable, Mapping
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+
+from app.core.config import settings
+
+
+class RowSerializer:
+    """Dumps rows shaped as schema, nested values (e.g. pyramid bands) must already be plain"""
+
+    def __init__(self, schema: type[BaseModel]):
+        self.adapter = TypeAdapter(list[schema])
+        self.item_adapter = TypeAdapter(schema)
+        self.fields = tuple(schema.model_fields)
+
+    def _project(self, row: Mapping) -> dict:
+        return {field: row.get(field) for field in self.fields}
+
+    def dump_json(self, rows: Iterable[Mapping]) -> bytes:
+        """JSON array of the rows"""
+        if settings.fast_json:
+            return orjson.dumps([self._project(row) for row in rows])
+        return self.adapter.dump_json(self.adapter.validate_python(rows))
+
+    def dump_lines(self, rows: Iterable[Mapping]) -> bytes:
+        """One JSON object per line, as the NDJSON streams send them"""
+        if settings.fast_json:
+            return b"".join(orjson.dumps(self._project(row)) + b"\n" for row in rows)
+        return b"".join(self.item_adapter.dump_json(self.item_adapter.validate_python(row)) + b"\n" for row in rows)
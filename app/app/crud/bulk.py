@@ -0,0 +1,414 @@
+import json
+from typing import AsyncIterator, Callable, Optional
+
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy import (
+    BigInteger, Column, Float, Identity, Integer, MetaData, String, Table, and_, delete, func, or_, select
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateTable
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.crud import derived as derived_crud
+from app.crud import partitions
+from app.crud import pyramids as pyramid_crud
+from app.crud import rollup as rollup_crud
+from app.crud.values import aggregated_conflict_target, detailed_conflict_target, refresh_availability
+from app.models import indicator as indicator_models
+
+CSV_CONTENT_TYPE = "text/csv"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# range of the integer columns, postgres integer is 32 bit
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+
+class LoadProgress:
+    """Row counters of a load, updated while the body is copied so that they can be read as it runs.
+
+    A load given a progress keeps going past invalid rows (unparseable or
+    wrongly typed NDJSON lines, rows without territory_id and oktmo) and counts them as failed
+    instead of rejecting the whole body.
+    """
+
+    def __init__(self):
+        self.rows_processed = 0
+        self.rows_failed = 0
+
+
+# Staging tables live for a single transaction and are not part of the models metadata
+staging_metadata = MetaData()
+
+aggregated_staging = Table(
+    "aggregated_indicator_values_staging",
+    staging_metadata,
+    Column("seq", BigInteger, Identity(always=True)),
+    Column("indicator_id", Integer),
+    Column("territory_id", Integer),
+    Column("oktmo", Integer),
+    Column("year", Integer),
+    Column("value", Float),
+    Column("source", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+detailed_staging = Table(
+    "detailed_indicator_values_staging",
+    staging_metadata,
+    Column("seq", BigInteger, Identity(always=True)),
+    Column("indicator_id", Integer),
+    Column("territory_id", Integer),
+    Column("oktmo", Integer),
+    Column("year", Integer),
+    Column("source", String),
+    Column("age_start", Integer),
+    Column("age_end", Integer),
+    Column("male", Float),
+    Column("female", Float),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+async def load_aggregated_indicator_values(
+    db: AsyncSession, chunks: AsyncIterator[bytes], content_type: Optional[str], progress: Optional[LoadProgress] = None
+) -> dict:
+    rows_received = await _copy_to_staging(
+        db, aggregated_staging, indicator_models.AggregatedIndicatorValue, chunks, content_type, progress
+    )
+    rows_merged = 0
+    for by_oktmo in (True, False):
+        rows_merged += await _merge(
+            db,
+            aggregated_staging,
+            indicator_models.AggregatedIndicatorValue,
+            aggregated_conflict_target(by_oktmo),
+            by_oktmo,
+            update_columns=("value", "source"),
+        )
+    for by_oktmo in (True, False):
+        await refresh_availability(db, indicator_models.AGGREGATED, _staged_keys(aggregated_staging), by_oktmo)
+    await rollup_crud.refresh_rollups(db, _staged_keys(aggregated_staging))
+    indicator_ids = (await db.scalars(select(aggregated_staging.c.indicator_id).distinct())).all()
+    # a bulk load touches arbitrary territories, dependent derived indicators are recomputed in full
+    derived_ids = await derived_crud.refresh_dependent_derived_indicators(db, list(indicator_ids))
+    await db.commit()
+    metrics.rows_ingested.labels(kind=indicator_models.AGGREGATED, path="bulk").inc(rows_merged)
+    for indicator_id in indicator_ids:
+        response_cache.invalidate(indicator_models.AGGREGATED, indicator_id)
+    derived_crud.invalidate_responses(derived_ids)
+    return {"rows_received": rows_received, "rows_merged": rows_merged}
+
+
+async def load_detailed_indicator_values(
+    db: AsyncSession, chunks: AsyncIterator[bytes], content_type: Optional[str], progress: Optional[LoadProgress] = None
+) -> dict:
+    rows_received = await _copy_to_staging(
+        db, detailed_staging, indicator_models.DetailedIndicatorValue, chunks, content_type, progress
+    )
+    rows_merged = 0
+    for by_oktmo in (True, False):
+        rows_merged += await _merge(
+            db,
+            detailed_staging,
+            indicator_models.DetailedIndicatorValue,
+            detailed_conflict_target(by_oktmo),
+            by_oktmo,
+            update_columns=("male", "female"),
+        )
+    for by_oktmo in (True, False):
+        await refresh_availability(db, indicator_models.DETAILED, _staged_keys(detailed_staging), by_oktmo)
+        await pyramid_crud.refresh_pyramids(db, _staged_keys(detailed_staging), by_oktmo)
+    indicator_ids = (await db.scalars(select(detailed_staging.c.indicator_id).distinct())).all()
+    await db.commit()
+    metrics.rows_ingested.labels(kind=indicator_models.DETAILED, path="bulk").inc(rows_merged)
+    for indicator_id in indicator_ids:
+        response_cache.invalidate(indicator_models.DETAILED, indicator_id)
+    return {"rows_received": rows_received, "rows_merged": rows_merged}
+
+
+async def reload_aggregated_year(
+    db: AsyncSession, year: int, chunks: AsyncIterator[bytes], content_type: Optional[str]
+) -> dict:
+    return await _reload_year(
+        db,
+        year,
+        aggregated_staging,
+        indicator_models.AggregatedIndicatorValue,
+        indicator_models.AGGREGATED,
+        aggregated_conflict_target,
+        chunks,
+        content_type,
+    )
+
+
+async def reload_detailed_year(
+    db: AsyncSession, year: int, chunks: AsyncIterator[bytes], content_type: Optional[str]
+) -> dict:
+    return await _reload_year(
+        db,
+        year,
+        detailed_staging,
+        indicator_models.DetailedIndicatorValue,
+        indicator_models.DETAILED,
+        detailed_conflict_target,
+        chunks,
+        content_type,
+    )
+
+
+async def _reload_year(
+    db: AsyncSession,
+    year: int,
+    staging: Table,
+    model,
+    kind: str,
+    conflict_target: Callable[[bool], dict],
+    chunks: AsyncIterator[bytes],
+    content_type: Optional[str],
+) -> dict:
+    """Replace every value of a year by the staged rows, swapping the year partition instead of merging"""
+    if not partitions.MIN_YEAR <= year <= partitions.MAX_YEAR:
+        raise HTTPException(400, "YEAR_OUT_OF_RANGE")
+    rows_received = await _copy_to_staging(db, staging, model, chunks, content_type)
+    other_years = await db.scalar(
+        select(func.count()).select_from(staging).where(or_(staging.c.year != year, staging.c.year.is_(None)))
+    )
+    if other_years:
+        raise HTTPException(400, "YEAR_MISMATCH")
+    indicator_ids = set(
+        (await db.scalars(select(model.indicator_id).where(model.year == year).distinct())).all()
+    ) | set((await db.scalars(select(staging.c.indicator_id).distinct())).all())
+
+    replacement = await partitions.create_replacement(db, model, year)
+    rows_merged = 0
+    for by_oktmo in (True, False):
+        rows = _deduplicated(staging, conflict_target(by_oktmo), by_oktmo)
+        result = await db.execute(
+            insert(replacement).from_select([column.name for column in rows.selected_columns], rows)
+        )
+        rows_merged += result.rowcount
+    derived_ids = []
+    if kind == indicator_models.AGGREGATED:
+        # stored values of derived indicators are not part of the payload, they carry over
+        await db.execute(
+            insert(replacement).from_select(
+                [column.name for column in model.__table__.columns],
+                select(*model.__table__.columns).where(
+                    model.year == year,
+                    model.source == derived_crud.DERIVED_SOURCE,
+                    ~select(1).where(staging.c.indicator_id == model.indicator_id).exists(),
+                ),
+            )
+        )
+    # every rebuild reads the replacement, the swap locks the whole value table and is the last statement
+    values = aliased(model, replacement, adapt_on_names=True)
+    keys = select(values.indicator_id, values.territory_id, values.oktmo, values.year)
+    if kind == indicator_models.AGGREGATED:
+        derived_ids = await derived_crud.refresh_dependent_derived_indicators(
+            db, list(indicator_ids), year=year, model=values
+        )
+    availability = indicator_models.IndicatorValueAvailability
+    await db.execute(delete(availability).where(availability.kind == kind, availability.year == year))
+    for by_oktmo in (True, False):
+        await refresh_availability(db, kind, keys, by_oktmo, model=values)
+    if kind == indicator_models.AGGREGATED:
+        rollups = indicator_models.AggregatedIndicatorRollup
+        await db.execute(delete(rollups).where(rollups.year == year))
+        await rollup_crud.refresh_rollups(db, keys, values)
+    elif settings.detailed_storage == "arrays":
+        pyramids = indicator_models.DetailedIndicatorPyramid
+        await db.execute(delete(pyramids).where(pyramids.year == year))
+        for by_oktmo in (True, False):
+            await pyramid_crud.refresh_pyramids(db, keys, by_oktmo, values)
+    await partitions.swap_year_partition(db, model, year)
+    await db.commit()
+    metrics.rows_ingested.labels(kind=kind, path="reload").inc(rows_merged)
+    for indicator_id in indicator_ids:
+        response_cache.invalidate(kind, indicator_id)
+    derived_crud.invalidate_responses(derived_ids)
+    return {"rows_received": rows_received, "rows_merged": rows_merged}
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """The body format of a load, CSV or NDJSON"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in (CSV_CONTENT_TYPE, NDJSON_CONTENT_TYPE):
+        raise HTTPException(415, f"Expected {CSV_CONTENT_TYPE} or {NDJSON_CONTENT_TYPE} body")
+    return media_type
+
+
+async def _copy_to_staging(
+    db: AsyncSession,
+    staging: Table,
+    model,
+    chunks: AsyncIterator[bytes],
+    content_type: Optional[str],
+    progress: Optional[LoadProgress] = None,
+) -> int:
+    """Stream the request body into a fresh staging table, returns the number of copied rows.
+
+    Rows the merge into model would reject fail the load with 400, or are
+    dropped and counted as failed when a progress is given.
+    """
+    body_type = media_type(content_type)
+    await db.execute(CreateTable(staging))
+    connection = await (await db.connection()).get_raw_connection()
+    driver_connection: asyncpg.Connection = connection.driver_connection
+    staged_columns = [column for column in staging.columns if column.name != "seq"]
+    columns = [column.name for column in staged_columns]
+    try:
+        if body_type == CSV_CONTENT_TYPE:
+            # the body goes to postgres as is, only the header is read to know the column order
+            header, body = await _split_header(chunks)
+            unknown_columns = set(header) - set(columns)
+            if unknown_columns:
+                raise HTTPException(400, f"Unknown columns: {', '.join(sorted(unknown_columns))}")
+            if progress:
+                body = _counted_lines(body, progress)
+            status = await driver_connection.copy_to_table(
+                staging.name, source=body, columns=header, format="csv"
+            )
+        else:
+            status = await driver_connection.copy_records_to_table(
+                staging.name, records=_iter_ndjson_records(chunks, staged_columns, progress), columns=columns
+            )
+    except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+        raise HTTPException(400, str(e))
+    rows_copied = int(status.split()[-1])
+    invalid = _invalid_rows(staging, model)
+    if progress:
+        progress.rows_processed = rows_copied + progress.rows_failed
+        result = await db.execute(delete(staging).where(or_(*invalid.values())))
+        progress.rows_failed += result.rowcount
+        return rows_copied - result.rowcount
+    counts = (await db.execute(select(*[func.count().filter(condition) for condition in invalid.values()]))).one()
+    for detail, count in zip(invalid, counts):
+        if count:
+            raise HTTPException(400, detail)
+    return rows_copied
+
+
+def _invalid_rows(staging: Table, model) -> dict:
+    """Conditions matching the staged rows the merge into model would reject, keyed by the error detail"""
+    invalid = {"TERRITORY_ID_OR_OKTMO_NOT_PROVIDED": and_(staging.c.territory_id.is_(None), staging.c.oktmo.is_(None))}
+    for column in model.__table__.columns:
+        if column.name in staging.c and (column.name == "indicator_id" or not column.nullable):
+            invalid[f"{column.name.upper()}_NOT_PROVIDED"] = staging.c[column.name].is_(None)
+    invalid["INDICATOR_NOT_FOUND"] = ~select(1).where(indicator_models.Indicator.id == staging.c.indicator_id).exists()
+    if "age_start" in staging.c:
+        # an age band needs at least one bound, see DetailedIndicatorValue
+        invalid["AGE_START_OR_AGE_END_NOT_PROVIDED"] = and_(staging.c.age_start.is_(None), staging.c.age_end.is_(None))
+    return invalid
+
+
+def _deduplicated(staging: Table, conflict_target: dict, by_oktmo: bool):
+    """Staged rows keyed by oktmo or by territory_id, the last staged row wins for duplicate keys"""
+    key = [staging.c[name] for name in conflict_target["index_elements"]]
+    staged_columns = [column for column in staging.columns if column.name != "seq"]
+    columns = [column.name for column in staged_columns]
+    return (
+        select(*[staging.c[name] for name in columns])
+        .where(staging.c.oktmo.isnot(None) if by_oktmo else staging.c.oktmo.is_(None))
+        .distinct(*key)
+        .order_by(*key, staging.c.seq.desc())
+    )
+
+
+async def _merge(
+    db: AsyncSession, staging: Table, model, conflict_target: dict, by_oktmo: bool, update_columns: tuple[str, ...]
+) -> int:
+    rows = _deduplicated(staging, conflict_target, by_oktmo)
+    query = insert(model).from_select([column.name for column in rows.selected_columns], rows)
+    query = query.on_conflict_do_update(
+        **conflict_target, set_={name: query.excluded[name] for name in update_columns}
+    )
+    result = await db.execute(query)
+    return result.rowcount
+
+
+def _staged_keys(staging: Table):
+    return select(staging.c.indicator_id, staging.c.territory_id, staging.c.oktmo, staging.c.year)
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+async def _split_header(chunks: AsyncIterator[bytes]) -> tuple[list[str], AsyncIterator[bytes]]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in buffer:
+            break
+    header, _, rest = buffer.partition(b"\n")
+
+    async def body():
+        if rest:
+            yield rest
+        async for chunk in chunks:
+            yield chunk
+
+    return [name.strip().strip('"') for name in header.decode().strip().split(",")], body()
+
+
+async def _counted_lines(chunks: AsyncIterator[bytes], progress: LoadProgress) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        progress.rows_processed += chunk.count(b"\n")
+        yield chunk
+
+
+async def _iter_ndjson_records(
+    chunks: AsyncIterator[bytes], columns: list[Column], progress: Optional[LoadProgress] = None
+) -> AsyncIterator[tuple]:
+    """Values of the columns per NDJSON line, checked against the column types before asyncpg encodes them"""
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        if progress:
+            progress.rows_processed += 1
+        try:
+            yield _ndjson_record(line, columns)
+        except ValueError as e:
+            if progress:
+                progress.rows_failed += 1
+                continue
+            raise HTTPException(400, f"Invalid NDJSON line {line_number}: {e}")
+
+
+def _ndjson_record(line: bytes, columns: list[Column]) -> tuple:
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    values = tuple(record.get(column.name) for column in columns)
+    for column, value in zip(columns, values):
+        if value is not None and not _valid_value(column.type, value):
+            raise ValueError(f"invalid {column.name}")
+    return values
+
+
+def _valid_value(column_type, value) -> bool:
+    if isinstance(column_type, String):
+        return isinstance(value, str)
+    # bool is an int subclass, but true is not a number here
+    if isinstance(value, bool):
+        return False
+    if isinstance(column_type, Integer):
+        return isinstance(value, int) and INT32_MIN <= value <= INT32_MAX
+    if isinstance(column_type, Float):
+        return isinstance(value, float) or isinstance(value, int) and abs(value) <= 2**1023
+    return True
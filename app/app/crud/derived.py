@@ -0,0 +1,211 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import expressions
+from app.core.catalog import catalog
+from app.core.response_cache import response_cache
+from app.crud import rollup as rollup_crud
+from app.crud import values as values_crud
+from app.models import indicator as indicator_models
+from app.schemas import indicator as schemas
+
+DERIVED_SOURCE = "derived"
+
+
+async def get_derived_indicator(db: AsyncSession, indicator_id: int) -> Optional[indicator_models.DerivedIndicator]:
+    return await db.get(indicator_models.DerivedIndicator, indicator_id)
+
+
+async def create_derived_indicator(
+    db: AsyncSession, request: schemas.DerivedIndicatorCreateRequest
+) -> indicator_models.DerivedIndicator:
+    try:
+        expressions.parse(request.expression, request.variables)
+    except expressions.ExpressionError as e:
+        raise HTTPException(400, str(e))
+    input_ids = sorted(set(request.variables.values()))
+    found = await db.scalar(
+        select(func.count())
+        .select_from(indicator_models.Indicator)
+        .where(indicator_models.Indicator.id == any_(literal(input_ids, ARRAY(Integer))))
+    )
+    if found != len(input_ids):
+        raise HTTPException(404, "Input indicator not found")
+    if not await catalog.get_unit(db, request.unit_id):
+        raise HTTPException(404, f"Unit with id {request.unit_id} not found")
+    existing = await db.scalar(
+        select(indicator_models.Indicator.id).where(
+            indicator_models.Indicator.name == request.name, indicator_models.Indicator.unit_id == request.unit_id
+        )
+    )
+    if existing:
+        raise HTTPException(409, f"Indicator with id {existing} has the same name and unit")
+
+    indicator = indicator_models.Indicator(name=request.name, unit_id=request.unit_id)
+    definition = indicator_models.DerivedIndicator(
+        indicator=indicator,
+        expression=request.expression,
+        variables=request.variables,
+        input_ids=input_ids,
+        materialized=request.materialized,
+    )
+    db.add(definition)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # created concurrently since the check above
+        raise HTTPException(409, "Indicator with the same name and unit exists")
+    if definition.materialized:
+        await refresh_derived_indicator(db, definition)
+    await db.commit()
+    await db.refresh(definition)
+    catalog.invalidate_indicator(definition.indicator_id)
+    return definition
+
+
+def _derived_values_query(
+    definition: indicator_models.DerivedIndicator,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    year: Optional[int] = None,
+    model=None,
+):
+    """Evaluates the expression for every (territory_id, oktmo, year) the inputs share in one statement.
+
+    The inputs are pivoted into one column per variable, keys where an input
+    is missing or a denominator is zero evaluate to NULL. model is the table
+    the inputs are read from, the aggregated value table by default.
+    """
+    if model is None:
+        model = indicator_models.AggregatedIndicatorValue
+    inputs = (
+        select(
+            model.territory_id,
+            model.oktmo,
+            model.year,
+            *[
+                func.max(model.value).filter(model.indicator_id == input_id).label(f"v_{variable}")
+                for variable, input_id in definition.variables.items()
+            ],
+        )
+        .where(model.indicator_id == any_(literal(definition.input_ids, ARRAY(Integer))))
+        .group_by(model.territory_id, model.oktmo, model.year)
+    )
+    if oktmo:
+        inputs = inputs.where(model.oktmo == oktmo)
+    elif territory_id:
+        inputs = inputs.where(model.territory_id == territory_id, model.oktmo.is_(None))
+    if year:
+        inputs = inputs.where(model.year == year)
+    inputs = inputs.subquery()
+    tree = expressions.parse(definition.expression, definition.variables)
+    value = expressions.to_sql(tree, {variable: inputs.c[f"v_{variable}"] for variable in definition.variables})
+    return inputs, select(
+        literal(definition.indicator_id, Integer).label("indicator_id"),
+        inputs.c.territory_id,
+        inputs.c.oktmo,
+        inputs.c.year,
+        value.label("value"),
+    )
+
+
+async def get_derived_indicator_values(
+    db: AsyncSession,
+    definition: indicator_models.DerivedIndicator,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    year: Optional[int] = None,
+):
+    _, query = _derived_values_query(definition, territory_id, oktmo, year)
+    query = query.subquery()
+    result = await db.execute(
+        select(query).where(query.c.value.isnot(None)).order_by(query.c.territory_id, query.c.oktmo, query.c.year)
+    )
+    return result.mappings().all()
+
+
+async def refresh_derived_indicator(
+    db: AsyncSession,
+    definition: indicator_models.DerivedIndicator,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    year: Optional[int] = None,
+    model=None,
+):
+    """Recomputes the stored values of a materialized derived indicator, for one territory or for all of them.
+
+    year limits the refresh to one year, model is the table the values are
+    read from and written to, the aggregated value table by default.
+    Does not commit, the caller commits together with the input values.
+    """
+    if model is None:
+        model = indicator_models.AggregatedIndicatorValue
+    stale = delete(model).where(model.indicator_id == definition.indicator_id)
+    if oktmo:
+        stale = stale.where(model.oktmo == oktmo)
+    elif territory_id:
+        stale = stale.where(model.territory_id == territory_id, model.oktmo.is_(None))
+    if year:
+        stale = stale.where(model.year == year)
+    await db.execute(stale)
+
+    inputs, query = _derived_values_query(definition, territory_id, oktmo, year, model)
+    query = query.add_columns(literal(DERIVED_SOURCE).label("source")).subquery()
+    await db.execute(
+        insert(model).from_select(
+            ["indicator_id", "territory_id", "oktmo", "year", "value", "source"],
+            select(query).where(query.c.value.isnot(None)),
+        )
+        .on_conflict_do_nothing()
+    )
+    keys = select(
+        literal(definition.indicator_id, Integer).label("indicator_id"),
+        inputs.c.territory_id,
+        inputs.c.oktmo,
+        inputs.c.year,
+    )
+    for by_oktmo in (True, False):
+        await values_crud.refresh_availability(db, indicator_models.AGGREGATED, keys, by_oktmo, model)
+    await rollup_crud.refresh_rollups(db, keys, model)
+
+
+async def refresh_dependent_derived_indicators(
+    db: AsyncSession,
+    indicator_ids: list[int],
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+    year: Optional[int] = None,
+    model=None,
+) -> list[int]:
+    """Refreshes the materialized derived indicators computed from the given ones, transitively.
+
+    year and model are passed to refresh_derived_indicator.
+    Returns the ids of the refreshed indicators. Does not commit.
+    """
+    refreshed: list[int] = []
+    pending = list(indicator_ids)
+    while pending:
+        result = await db.scalars(
+            select(indicator_models.DerivedIndicator).where(
+                indicator_models.DerivedIndicator.materialized.is_(True),
+                indicator_models.DerivedIndicator.input_ids.overlap(literal(pending, ARRAY(Integer))),
+            )
+        )
+        pending = []
+        for definition in result.all():
+            if definition.indicator_id in refreshed:
+                continue
+            await refresh_derived_indicator(db, definition, territory_id, oktmo, year, model)
+            refreshed.append(definition.indicator_id)
+            pending.append(definition.indicator_id)
+    return refreshed
+
+
+def invalidate_responses(indicator_ids: list[int]):
+    for indicator_id in indicator_ids:
+        response_cache.invalidate(indicator_models.AGGREGATED, indicator_id)
@@ -0,0 +1,38 @@
+from typing import AsyncIterator
+
+import pyarrow as pa
+from sqlalchemy import Integer, any_, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.columnar import AGGREGATED_SCHEMA, DETAILED_SCHEMA, record_batch
+from app.models import indicator as indicator_models
+
+
+async def iter_aggregated_value_batches(
+    db: AsyncSession, indicator_ids: list[int], batch_size: int
+) -> AsyncIterator[pa.RecordBatch]:
+    model = indicator_models.AggregatedIndicatorValue
+    query = select(*[model.__table__.c[name] for name in AGGREGATED_SCHEMA.names]).where(
+        model.indicator_id == any_(literal(indicator_ids, ARRAY(Integer)))
+    )
+    async for batch in _iter_batches(db, query, AGGREGATED_SCHEMA, batch_size):
+        yield batch
+
+
+async def iter_detailed_value_batches(
+    db: AsyncSession, indicator_ids: list[int], batch_size: int
+) -> AsyncIterator[pa.RecordBatch]:
+    model = indicator_models.DetailedIndicatorValue
+    query = select(*[model.__table__.c[name] for name in DETAILED_SCHEMA.names]).where(
+        model.indicator_id == any_(literal(indicator_ids, ARRAY(Integer)))
+    )
+    async for batch in _iter_batches(db, query, DETAILED_SCHEMA, batch_size):
+        yield batch
+
+
+async def _iter_batches(db: AsyncSession, query, schema: pa.Schema, batch_size: int) -> AsyncIterator[pa.RecordBatch]:
+    """Rows come from a server-side cursor, one record batch per fetched partition"""
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield record_batch(rows, schema)
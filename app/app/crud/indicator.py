@@ -1,21 +1,58 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
 
+import numpy as np
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, distinct
+from app.core import gapfill, metrics
+from app.core.catalog import catalog
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from sqlalchemy import select, any_, func, literal, tuple_, Integer, Float, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from app.crud import derived as derived_crud
+from app.crud import pyramids as pyramid_crud
+from app.crud import rollup as rollup_crud
+from app.crud import values as values_crud
 from app.models import indicator as indicator_models, unit as unit_models
 from app.schemas import indicator as schemas
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm import joinedload
 
 
-async def get_indicators(db: AsyncSession, skip: int = 0, limit: int = 10) -> list[indicator_models.Indicator]:
-    result = await db.execute(
-        select(indicator_models.Indicator)
-        .options(joinedload(indicator_models.Indicator.unit))
-        .offset(skip)
-        .limit(limit)
-    )
-    return result.scalars().all()
+async def get_indicators(
+    db: AsyncSession,
+    limit: int = 10,
+    after: Optional[list] = None,
+    order_by: str = "id",
+    name_prefix: Optional[str] = None,
+    skip: int = 0,
+):
+    """Keyset page of (id, name, unit_name) rows ordered by id or by (name, id).
+
+    after is the sort key of the last row of the previous page. The name
+    lower bounds let the scan start in the name index instead of filtering
+    the whole table.
+    """
+    query = select(
+        indicator_models.Indicator.id, indicator_models.Indicator.name, unit_models.Unit.unit_name
+    ).join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+    if name_prefix:
+        query = query.where(
+            indicator_models.Indicator.name >= name_prefix,
+            indicator_models.Indicator.name.startswith(name_prefix, autoescape=True),
+        )
+    if order_by == "name":
+        if after is not None:
+            query = query.where(
+                indicator_models.Indicator.name >= after[0],
+                tuple_(indicator_models.Indicator.name, indicator_models.Indicator.id) > tuple_(*after),
+            )
+        query = query.order_by(indicator_models.Indicator.name, indicator_models.Indicator.id)
+    else:
+        if after is not None:
+            query = query.where(indicator_models.Indicator.id > after[0])
+        query = query.order_by(indicator_models.Indicator.id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.mappings().all()
 
 
 async def get_indicator(db: AsyncSession, indicator_id: int) -> indicator_models.Indicator:
@@ -40,31 +77,52 @@ async def create_indicator(db: AsyncSession, indicator: schemas.IndicatorCreateR
     db.add(db_indicator)
     await db.commit()
     await db.refresh(db_indicator)
+    catalog.invalidate_indicator(db_indicator.id)
     return db_indicator
 
 
-async def get_aggregated_indicator_values_availability(db: AsyncSession, indicator_id: int):
-    result = await db.execute(
-        select(indicator_models.AggregatedIndicatorValue).filter(
-            indicator_models.AggregatedIndicatorValue.indicator_id == indicator_id
-        )
-    )
+async def get_aggregated_indicator_values_availability(
+    db: AsyncSession,
+    indicator_id: int,
+    year: Optional[int] = None,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+):
+    return await _get_availability(db, indicator_models.AGGREGATED, indicator_id, year, territory_id, oktmo)
 
-    return [
-        {"year": row.year, "territory_id": row.territory_id, "source": row.source, "oktmo": row.oktmo} for row in result.scalars().all()
-    ]
 
+async def get_detailed_indicator_values_availability(
+    db: AsyncSession,
+    indicator_id: int,
+    year: Optional[int] = None,
+    territory_id: Optional[int] = None,
+    oktmo: Optional[int] = None,
+):
+    return await _get_availability(db, indicator_models.DETAILED, indicator_id, year, territory_id, oktmo)
 
-async def get_detailed_indicator_values_availability(db: AsyncSession, indicator_id: int):
-    result = await db.execute(
-        select(indicator_models.DetailedIndicatorValue).filter(
-            indicator_models.DetailedIndicatorValue.indicator_id == indicator_id
-        )
-    )
 
-    return [
-        {"year": row.year, "territory_id": row.territory_id, "source": row.source, "oktmo": row.oktmo} for row in result.scalars().all()
-    ]
+async def _get_availability(
+    db: AsyncSession,
+    kind: str,
+    indicator_id: int,
+    year: Optional[int],
+    territory_id: Optional[int],
+    oktmo: Optional[int],
+):
+    availability = indicator_models.IndicatorValueAvailability
+    query = (
+        select(availability.year, availability.territory_id, availability.source, availability.oktmo)
+        .where(availability.indicator_id == indicator_id, availability.kind == kind)
+        .order_by(availability.year, availability.territory_id, availability.oktmo, availability.source)
+    )
+    if year is not None:
+        query = query.where(availability.year == year)
+    if territory_id is not None:
+        query = query.where(availability.territory_id == territory_id)
+    if oktmo is not None:
+        query = query.where(availability.oktmo == oktmo)
+    result = await db.execute(query)
+    return result.mappings().all()
 
 
 async def create_aggregated_indicator_values(
@@ -76,42 +134,64 @@ async def create_aggregated_indicator_values(
 ):
     if not territory_id and not oktmo:
         raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
-    # indicator = await get_indicator(db, indicator_id)
-    for indicator_value in indicator_values:
-        query = select(indicator_models.AggregatedIndicatorValue).where(
-            indicator_models.AggregatedIndicatorValue.indicator_id == indicator_id,
-            indicator_models.AggregatedIndicatorValue.year == indicator_value.year,
-        )
-        if oktmo:
-            query = query.where(indicator_models.AggregatedIndicatorValue.oktmo == oktmo)
-        else:
-            query = query.where(indicator_models.AggregatedIndicatorValue.territory_id == territory_id)
-        result = await db.execute(query)
-        if result.scalars().all():
-            query = (
-                update(indicator_models.AggregatedIndicatorValue)
-                .where(
-                    indicator_models.AggregatedIndicatorValue.indicator_id == indicator_id,
-                    indicator_models.AggregatedIndicatorValue.year == indicator_value.year,
-                )
-            )
-            if oktmo:
-                query = query.where(indicator_models.AggregatedIndicatorValue.oktmo == oktmo)
-            else:
-                query = query.where(indicator_models.AggregatedIndicatorValue.territory_id == territory_id)
-            query = query.values(value=indicator_value.value, source=indicator_value.source)
-            await db.execute(query)
-        else:
-            db_indicator_aggregated_value = indicator_models.AggregatedIndicatorValue(
-                indicator_id=indicator_id,
-                territory_id=territory_id,
-                oktmo=oktmo,
-                year=indicator_value.year,
-                value=indicator_value.value,
-                source=indicator_value.source,
-            )
-            db.add(db_indicator_aggregated_value)
+    # one value per year is allowed by the unique key, the last one in the payload wins
+    values_by_year = {indicator_value.year: indicator_value for indicator_value in indicator_values}
+    if not values_by_year:
+        return
+    rows = func.unnest(
+        literal(list(values_by_year), ARRAY(Integer)),
+        literal([value.value for value in values_by_year.values()], ARRAY(Float)),
+        literal([value.source for value in values_by_year.values()], ARRAY(String)),
+    ).table_valued("year", "value", "source").render_derived()
+    query = insert(indicator_models.AggregatedIndicatorValue).from_select(
+        ["indicator_id", "territory_id", "oktmo", "year", "value", "source"],
+        select(
+            literal(indicator_id, Integer),
+            literal(territory_id, Integer),
+            literal(oktmo, Integer),
+            rows.c.year,
+            rows.c.value,
+            rows.c.source,
+        ),
+    )
+    query = query.on_conflict_do_update(
+        **values_crud.aggregated_conflict_target(bool(oktmo)),
+        set_={"value": query.excluded.value, "source": query.excluded.source},
+    )
+    await db.execute(query)
+    keys = values_crud.written_keys(indicator_id, territory_id, oktmo, list(values_by_year))
+    await values_crud.refresh_availability(db, indicator_models.AGGREGATED, keys, by_oktmo=bool(oktmo))
+    await rollup_crud.refresh_rollups(db, keys)
+    derived_ids = await derived_crud.refresh_dependent_derived_indicators(db, [indicator_id], territory_id, oktmo)
     await db.commit()
+    metrics.rows_ingested.labels(kind=indicator_models.AGGREGATED, path="api").inc(len(values_by_year))
+    response_cache.invalidate(indicator_models.AGGREGATED, indicator_id, territory_id, oktmo)
+    for parent in rollup_crud.parents(oktmo):
+        response_cache.invalidate(indicator_models.AGGREGATED, indicator_id, oktmo=parent)
+    derived_crud.invalidate_responses(derived_ids)
+
+
+def _aggregated_values_query(indicator_id: int):
+    """Value rows of an indicator shaped as IndicatorAggregatedResponse, indicator name and unit are joined in"""
+    return (
+        select(
+            indicator_models.AggregatedIndicatorValue.id,
+            indicator_models.AggregatedIndicatorValue.indicator_id,
+            indicator_models.Indicator.name,
+            unit_models.Unit.unit_name.label("unit"),
+            indicator_models.AggregatedIndicatorValue.territory_id,
+            indicator_models.AggregatedIndicatorValue.oktmo,
+            indicator_models.AggregatedIndicatorValue.year,
+            indicator_models.AggregatedIndicatorValue.source,
+            indicator_models.AggregatedIndicatorValue.value,
+        )
+        .join(
+            indicator_models.Indicator,
+            indicator_models.Indicator.id == indicator_models.AggregatedIndicatorValue.indicator_id,
+        )
+        .join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+        .where(indicator_models.AggregatedIndicatorValue.indicator_id == indicator_id)
+    )
 
 
 async def get_aggregated_indicator_values(
@@ -121,16 +201,10 @@ async def get_aggregated_indicator_values(
         oktmo: Optional[int],
         year: int = None
 ):
+    """Returns plain rows shaped as IndicatorAggregatedResponse"""
     if not territory_id and not oktmo:
         raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
-    query = (
-        select(indicator_models.AggregatedIndicatorValue)
-        .where(
-            indicator_models.AggregatedIndicatorValue.indicator_id == indicator_id,
-            indicator_models.AggregatedIndicatorValue.territory_id == territory_id,
-        )
-        .options(joinedload(indicator_models.AggregatedIndicatorValue.indicator))
-    )
+    query = _aggregated_values_query(indicator_id)
     if year:
         query = query.where(indicator_models.AggregatedIndicatorValue.year == year)
     if oktmo:
@@ -138,18 +212,112 @@ async def get_aggregated_indicator_values(
     else:
         query = query.where(indicator_models.AggregatedIndicatorValue.territory_id == territory_id)
     result = await db.execute(query)
-    return result.scalars().all()
+    return result.mappings().all()
+
+
+async def stream_aggregated_indicator_values(
+    db: AsyncSession, indicator_id: int, year: Optional[int], batch_size: int
+) -> AsyncIterator[list]:
+    """Every value of an indicator across territories, read through a server-side cursor in batches"""
+    query = _aggregated_values_query(indicator_id)
+    if year:
+        query = query.where(indicator_models.AggregatedIndicatorValue.year == year)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.mappings().partitions():
+        yield rows
+
+
+MATRIX_MAX_CELLS = 10_000_000
+
+
+async def get_aggregated_indicator_values_matrix(
+    db: AsyncSession, request: schemas.IndicatorMatrixRequest
+) -> schemas.IndicatorMatrixResponse:
+    if bool(request.territory_ids) == bool(request.oktmo):
+        raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
+    indicator_ids = list(dict.fromkeys(request.indicator_ids))
+    territories = list(dict.fromkeys(request.oktmo or request.territory_ids))
+    years = list(range(request.year_from, request.year_to + 1))
+    if len(indicator_ids) * len(territories) * len(years) > MATRIX_MAX_CELLS:
+        raise HTTPException(400, "MATRIX_TOO_LARGE")
+
+    territory_column = (
+        indicator_models.AggregatedIndicatorValue.oktmo
+        if request.oktmo
+        else indicator_models.AggregatedIndicatorValue.territory_id
+    )
+    query = select(
+        indicator_models.AggregatedIndicatorValue.indicator_id,
+        territory_column,
+        indicator_models.AggregatedIndicatorValue.year,
+        indicator_models.AggregatedIndicatorValue.value,
+    ).where(
+        indicator_models.AggregatedIndicatorValue.indicator_id == any_(literal(indicator_ids, ARRAY(Integer))),
+        territory_column == any_(literal(territories, ARRAY(Integer))),
+        indicator_models.AggregatedIndicatorValue.year.between(request.year_from, request.year_to),
+    )
+    result = await db.execute(query)
+
+    indicator_positions = {indicator_id: i for i, indicator_id in enumerate(indicator_ids)}
+    territory_positions = {territory: i for i, territory in enumerate(territories)}
+    values: list[Optional[float]] = [None] * (len(indicator_ids) * len(territories) * len(years))
+    for indicator_id, territory, year, value in result:
+        position = indicator_positions[indicator_id] * len(territories) + territory_positions[territory]
+        values[position * len(years) + year - request.year_from] = value
+
+    imputed = None
+    if request.fill and values:
+        # every (indicator, territory) series is a row of one array, filled in a single pass
+        series = np.array(values, dtype=float).reshape(-1, len(years))
+        filled, imputed_cells = gapfill.fill(series, request.fill)
+        values = [None if np.isnan(value) else value for value in filled.ravel().tolist()]
+        imputed = imputed_cells.ravel().tolist()
+
+    return schemas.IndicatorMatrixResponse(
+        indicator_ids=indicator_ids,
+        territory_ids=None if request.oktmo else territories,
+        oktmo=territories if request.oktmo else None,
+        years=years,
+        values=values,
+        imputed=imputed,
+    )
 
 
 async def get_detailed_indicator_values(
     db: AsyncSession, indicator_id: int, territory_id: Optional[int], oktmo: Optional[int], year: int | None = None
 ) -> list[schemas.IndicatorDetailedResponse] | None:
+    rows = await get_detailed_indicator_rows(db, indicator_id, territory_id, oktmo, year)
+    if rows is None:
+        return None
+    return [schemas.IndicatorDetailedResponse.model_validate(row) for row in rows]
+
+
+async def get_detailed_indicator_rows(
+    db: AsyncSession, indicator_id: int, territory_id: Optional[int], oktmo: Optional[int], year: int | None = None
+) -> list[dict] | None:
+    """Plain dicts shaped as IndicatorDetailedResponse, one per (year, source)"""
+    if settings.detailed_storage == "arrays":
+        return await pyramid_crud.get_pyramid_rows(db, indicator_id, territory_id, oktmo, year)
     if not territory_id and not oktmo:
         raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
     query = (
-        select(indicator_models.DetailedIndicatorValue)
-        .options(joinedload(indicator_models.DetailedIndicatorValue.indicator))
-        .order_by(indicator_models.DetailedIndicatorValue.age_start)
+        select(
+            indicator_models.DetailedIndicatorValue.territory_id,
+            indicator_models.DetailedIndicatorValue.oktmo,
+            indicator_models.DetailedIndicatorValue.year,
+            indicator_models.DetailedIndicatorValue.source,
+            indicator_models.DetailedIndicatorValue.age_start,
+            indicator_models.DetailedIndicatorValue.age_end,
+            indicator_models.DetailedIndicatorValue.male,
+            indicator_models.DetailedIndicatorValue.female,
+            unit_models.Unit.unit_name,
+        )
+        .join(
+            indicator_models.Indicator,
+            indicator_models.Indicator.id == indicator_models.DetailedIndicatorValue.indicator_id,
+        )
+        .join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+        .order_by(indicator_models.DetailedIndicatorValue.year, indicator_models.DetailedIndicatorValue.age_start)
     )
 
     if oktmo:
@@ -166,34 +334,28 @@ async def get_detailed_indicator_values(
         query = query.filter(indicator_models.DetailedIndicatorValue.year == year)
 
     result = await db.execute(query)
-    values = result.scalars().all()
+    values = result.all()
 
     if not values:
         return None
 
     # Group by year if year is None
-    values_by_year: dict[schemas.IndicatorUniqueDetailedPair, list[schemas.DetailedIndicatorValue]] = {}
+    values_by_year: dict[tuple[int, str], list] = {}
     for value in values:
-        pair = schemas.IndicatorUniqueDetailedPair(year=value.year, source=value.source)
-        if pair not in values_by_year:
-            values_by_year[pair] = []
-        values_by_year[pair].append(value)
+        values_by_year.setdefault((value.year, value.source), []).append(value)
 
     responses = []
-    for pair, values in values_by_year.items():
+    for (pair_year, pair_source), values in values_by_year.items():
         first_value = values[0]
-        unit = await first_value.indicator.awaitable_attrs.unit
-        response = schemas.IndicatorDetailedResponse(
+        response = dict(
             indicator_id=indicator_id,
             territory_id=first_value.territory_id,
             oktmo=first_value.oktmo,
-            unit=unit.unit_name,
-            year=pair.year,
-            source=pair.source,
+            unit=first_value.unit_name,
+            year=pair_year,
+            source=pair_source,
             data=[
-                schemas.IndicatorDetailedData(
-                    age_start=value.age_start, age_end=value.age_end, male=value.male, female=value.female
-                )
+                dict(age_start=value.age_start, age_end=value.age_end, male=value.male, female=value.female)
                 for value in values
             ],
         )
@@ -208,70 +370,67 @@ async def load_detailed_indicator_values(
     territory_id: Optional[int],
     oktmo: Optional[int],
     request: schemas.LoadIndicatorDetailedRequest
-) -> list[indicator_models.DetailedIndicatorValue]:
+) -> list[schemas.IndicatorDetailedResponse]:
     if not territory_id and not oktmo:
         raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
-    for data in request.data:
-        query = (
-            select(indicator_models.DetailedIndicatorValue)
-            .options(joinedload(indicator_models.DetailedIndicatorValue.indicator))
-            .filter(
-                indicator_models.DetailedIndicatorValue.indicator_id == indicator_id,
-                indicator_models.DetailedIndicatorValue.territory_id == territory_id,
-                indicator_models.DetailedIndicatorValue.age_start == data.age_start,
-                indicator_models.DetailedIndicatorValue.age_end == data.age_end,
-                indicator_models.DetailedIndicatorValue.year == request.year,
-            )
-        )
-
-        if oktmo:
-            query = query.filter(
-                indicator_models.DetailedIndicatorValue.indicator_id == indicator_id,
-                indicator_models.DetailedIndicatorValue.oktmo == oktmo,
-                indicator_models.DetailedIndicatorValue.age_start == data.age_start,
-                indicator_models.DetailedIndicatorValue.age_end == data.age_end,
-                indicator_models.DetailedIndicatorValue.year == request.year,
-            )
-        else:
-            query = query.filter(
-                indicator_models.DetailedIndicatorValue.indicator_id == indicator_id,
-                indicator_models.DetailedIndicatorValue.territory_id == territory_id,
-                indicator_models.DetailedIndicatorValue.age_start == data.age_start,
-                indicator_models.DetailedIndicatorValue.age_end == data.age_end,
-                indicator_models.DetailedIndicatorValue.year == request.year,
-            )
-        result = await db.execute(query)
-        if result.scalars().all():
-            query = (
-                update(indicator_models.DetailedIndicatorValue)
-                .where(
-                    indicator_models.DetailedIndicatorValue.indicator_id == indicator_id,
-                    indicator_models.DetailedIndicatorValue.age_start == data.age_start,
-                    indicator_models.DetailedIndicatorValue.age_end == data.age_end,
-                    indicator_models.DetailedIndicatorValue.year == request.year,
-                )
-                .values(male=data.male, female=data.female)
-            )
-            if oktmo:
-                query = query.where(indicator_models.DetailedIndicatorValue.oktmo == oktmo)
-            else:
-                query = query.where(indicator_models.DetailedIndicatorValue.territory_id == territory_id)
-            await db.execute(query)
-
-        else:
-            value = indicator_models.DetailedIndicatorValue(
-                indicator_id=indicator_id,
-                territory_id=territory_id,
-                oktmo=oktmo,
-                year=request.year,
-                age_start=data.age_start,
-                age_end=data.age_end,
-                source=request.source,
-                male=data.male,
-                female=data.female,
-            )
-
-            db.add(value)
+    # one value per age band is allowed by the unique key, the last one in the payload wins
+    bands = {(data.age_start, data.age_end): data for data in request.data}
+    if not bands:
+        return []
+    rows = func.unnest(
+        literal([data.age_start for data in bands.values()], ARRAY(Integer)),
+        literal([data.age_end for data in bands.values()], ARRAY(Integer)),
+        literal([data.male for data in bands.values()], ARRAY(Float)),
+        literal([data.female for data in bands.values()], ARRAY(Float)),
+    ).table_valued("age_start", "age_end", "male", "female").render_derived()
+    query = insert(indicator_models.DetailedIndicatorValue).from_select(
+        ["indicator_id", "territory_id", "oktmo", "year", "source", "age_start", "age_end", "male", "female"],
+        select(
+            literal(indicator_id, Integer),
+            literal(territory_id, Integer),
+            literal(oktmo, Integer),
+            literal(request.year, Integer),
+            literal(request.source, String),
+            rows.c.age_start,
+            rows.c.age_end,
+            rows.c.male,
+            rows.c.female,
+        ),
+    )
+    query = query.on_conflict_do_update(
+        **values_crud.detailed_conflict_target(bool(oktmo)),
+        set_={"male": query.excluded.male, "female": query.excluded.female},
+    ).returning(
+        indicator_models.DetailedIndicatorValue.territory_id,
+        indicator_models.DetailedIndicatorValue.oktmo,
+        indicator_models.DetailedIndicatorValue.age_start,
+        indicator_models.DetailedIndicatorValue.age_end,
+        indicator_models.DetailedIndicatorValue.male,
+        indicator_models.DetailedIndicatorValue.female,
+    )
+    merged = (await db.execute(query)).all()
+    keys = values_crud.written_keys(indicator_id, territory_id, oktmo, [request.year])
+    await values_crud.refresh_availability(db, indicator_models.DETAILED, keys, by_oktmo=bool(oktmo))
+    await pyramid_crud.refresh_pyramids(db, keys, by_oktmo=bool(oktmo))
+    indicator = await catalog.get_indicator(db, indicator_id)
     await db.commit()
+    metrics.rows_ingested.labels(kind=indicator_models.DETAILED, path="api").inc(len(merged))
+    response_cache.invalidate(indicator_models.DETAILED, indicator_id, territory_id, oktmo)
 
-    return await get_detailed_indicator_values(db, indicator_id, territory_id, oktmo, year=request.year)
+    merged.sort(key=lambda row: row.age_start)
+    return [
+        schemas.IndicatorDetailedResponse(
+            indicator_id=indicator_id,
+            territory_id=merged[0].territory_id,
+            oktmo=merged[0].oktmo,
+            unit=indicator.unit_name,
+            year=request.year,
+            source=request.source,
+            data=[
+                schemas.IndicatorDetailedData(
+                    age_start=row.age_start, age_end=row.age_end, male=row.male, female=row.female
+                )
+                for row in merged
+            ],
+        )
+    ]
@@ -0,0 +1,68 @@
+from sqlalchemy import column, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# years a partition can be created for, the partition bounds are year and year + 1
+MIN_YEAR, MAX_YEAR = 1, 9999
+
+
+def year_partition(model, year: int) -> str:
+    return f"{model.__tablename__}_y{year}"
+
+
+def default_partition(model) -> str:
+    return f"{model.__tablename__}_default"
+
+
+async def _partition_exists(db: AsyncSession, name: str) -> bool:
+    return await db.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+
+
+async def create_year_partition(db: AsyncSession, model, year: int):
+    """Give a year its own partition, moving its rows out of the default partition.
+
+    Takes an ACCESS EXCLUSIVE lock on the value table until the transaction ends.
+    """
+    name = year_partition(model, year)
+    if await _partition_exists(db, name):
+        return
+    parent, default = model.__tablename__, default_partition(model)
+    # postgres refuses a new partition while the default one holds rows that belong to it
+    await db.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {default}"))
+    await db.execute(text(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM ({year}) TO ({year + 1})"))
+    columns = ", ".join(model.__table__.columns.keys())
+    await db.execute(
+        text(f"WITH moved AS (DELETE FROM {default} WHERE year = :year RETURNING {columns}) "
+             f"INSERT INTO {parent} ({columns}) SELECT {columns} FROM moved"),
+        {"year": year},
+    )
+    await db.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {default} DEFAULT"))
+
+
+async def create_replacement(db: AsyncSession, model, year: int):
+    """Empty table shaped like the year partition, returned as a table clause to insert into.
+
+    The CHECK on year lets the swap attach it without scanning it.
+    """
+    name = f"{year_partition(model, year)}_replacement"
+    await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    await db.execute(text(f"CREATE TABLE {name} (LIKE {model.__tablename__} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await db.execute(text(f"ALTER TABLE {name} ADD CHECK (year >= {year} AND year < {year + 1})"))
+    return table(name, *[column(model_column.name, model_column.type) for model_column in model.__table__.columns])
+
+
+async def swap_year_partition(db: AsyncSession, model, year: int):
+    """Replace the year partition with the table filled after create_replacement.
+
+    Attaching builds the indexes of the replacement. The old partition is
+    dropped, so the swap is visible to readers only at commit.
+    """
+    parent, name = model.__tablename__, year_partition(model, year)
+    replacement = f"{name}_replacement"
+    await create_year_partition(db, model, year)
+    await db.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+    await db.execute(text(f"DROP TABLE {name}"))
+    await db.execute(
+        text(f"ALTER TABLE {parent} ATTACH PARTITION {replacement} FOR VALUES FROM ({year}) TO ({year + 1})")
+    )
+    await db.execute(text(f"ALTER TABLE {replacement} RENAME TO {name}"))
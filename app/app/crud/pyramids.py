@@ -0,0 +1,115 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import values as values_crud
+from app.models import indicator as indicator_models, unit as unit_models
+
+PYRAMID_COLUMNS = ["indicator_id", "territory_id", "oktmo", "year", "source", "age_start", "age_end", "male", "female"]
+
+
+async def get_pyramid_rows(
+    db: AsyncSession, indicator_id: int, territory_id: Optional[int], oktmo: Optional[int], year: Optional[int] = None
+) -> list[dict] | None:
+    """Same result as crud.indicator.get_detailed_indicator_rows, one row per (year, source)"""
+    if not territory_id and not oktmo:
+        raise HTTPException(400, "TERRITORY_ID_OR_OKTMO_NOT_PROVIDED")
+    model = indicator_models.DetailedIndicatorPyramid
+    query = (
+        select(model, unit_models.Unit.unit_name)
+        .join(indicator_models.Indicator, indicator_models.Indicator.id == model.indicator_id)
+        .join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+        .where(model.indicator_id == indicator_id)
+        .order_by(model.year, model.source)
+    )
+    if oktmo:
+        query = query.where(model.oktmo == oktmo)
+    else:
+        query = query.where(model.territory_id == territory_id)
+    if year is not None:
+        query = query.where(model.year == year)
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return None
+    return [_row(pyramid, unit_name) for pyramid, unit_name in rows]
+
+
+def _row(pyramid, unit_name: str) -> dict:
+    return dict(
+        indicator_id=pyramid.indicator_id,
+        territory_id=pyramid.territory_id,
+        oktmo=pyramid.oktmo,
+        unit=unit_name,
+        year=pyramid.year,
+        source=pyramid.source,
+        data=[
+            dict(age_start=age_start, age_end=age_end, male=male, female=female)
+            for age_start, age_end, male, female in zip(
+                pyramid.age_start, pyramid.age_end, pyramid.male, pyramid.female
+            )
+        ],
+    )
+
+
+def _pyramids_from_rows(rows):
+    """Pyramids aggregated from the rows layout, one per (indicator, territory key, year, source)"""
+    band_order = (rows.age_start, rows.age_end.is_(None), rows.age_end)
+    # values keyed by oktmo form one pyramid even if their bands carry different territory_id
+    territory_key = case((rows.oktmo.is_(None), rows.territory_id))
+    return (
+        select(
+            rows.indicator_id,
+            func.max(rows.territory_id),
+            rows.oktmo,
+            rows.year,
+            rows.source,
+            *[
+                func.array_agg(aggregate_order_by(column, *band_order))
+                for column in (rows.age_start, rows.age_end, rows.male, rows.female)
+            ],
+        )
+        .where(rows.indicator_id.isnot(None))
+        .group_by(rows.indicator_id, territory_key, rows.oktmo, rows.year, rows.source)
+    )
+
+
+async def refresh_pyramids(db: AsyncSession, keys, by_oktmo: bool, rows=None):
+    """Rebuild the pyramids of the detailed value keys that were just written from the rows layout.
+
+    The rows stay the stored values, the pyramids are a copy for the reads
+    with detailed_storage set to arrays and are left alone otherwise. keys is
+    a selectable as for values_crud.refresh_availability, rows the table the
+    values are read from, the detailed value table by default. Does not commit.
+    """
+    if settings.detailed_storage != "arrays":
+        return
+    if rows is None:
+        rows = indicator_models.DetailedIndicatorValue
+    pyramids = indicator_models.DetailedIndicatorPyramid
+    keys = values_crud.matching_keys(keys, by_oktmo)
+    await db.execute(
+        delete(pyramids).where(
+            select(1).select_from(keys).where(*values_crud.key_matches(pyramids, keys, by_oktmo)).exists()
+        )
+    )
+    await db.execute(
+        insert(pyramids).from_select(
+            PYRAMID_COLUMNS,
+            _pyramids_from_rows(rows).join(keys, and_(*values_crud.key_matches(rows, keys, by_oktmo))),
+        )
+    )
+
+
+async def rebuild_from_rows(db: AsyncSession):
+    """Replace every stored pyramid by the ones aggregated from the rows layout, see app.db.rebuild_pyramids.
+
+    Does not commit.
+    """
+    pyramids = indicator_models.DetailedIndicatorPyramid
+    await db.execute(delete(pyramids))
+    rows = _pyramids_from_rows(indicator_models.DetailedIndicatorValue)
+    await db.execute(insert(pyramids).from_select(PYRAMID_COLUMNS, rows))
@@ -0,0 +1,132 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, String, and_, delete, func, literal, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import oktmo as oktmo_codes
+from app.models import indicator as indicator_models, unit as unit_models
+
+ROLLUP_SOURCE = "rollup"
+
+
+def _children(level: str, parents, values):
+    """Values summed into the parents of the level: settlements for districts, districts for regions.
+
+    A district without a value of its own contributes its rollup.
+    """
+    rollups = indicator_models.AggregatedIndicatorRollup
+
+    def within(table):
+        # a range on oktmo keeps the (indicator_id, oktmo, year) indexes usable
+        return and_(
+            table.indicator_id == parents.c.indicator_id,
+            table.year == parents.c.year,
+            table.oktmo >= parents.c.oktmo,
+            table.oktmo < parents.c.oktmo + oktmo_codes.span(level),
+        )
+
+    stored = (
+        select(values.indicator_id, values.oktmo, values.year, values.value)
+        .join(parents, within(values))
+        .where(oktmo_codes.is_child(values.oktmo, level))
+    )
+    if level == oktmo_codes.DISTRICT:
+        return stored.subquery()
+    shadowed = (
+        select(1)
+        .where(values.indicator_id == rollups.indicator_id, values.oktmo == rollups.oktmo, values.year == rollups.year)
+        .exists()
+    )
+    computed = (
+        select(rollups.indicator_id, rollups.oktmo, rollups.year, rollups.value)
+        .join(parents, within(rollups))
+        .where(rollups.level == oktmo_codes.DISTRICT, ~shadowed)
+    )
+    return union_all(stored, computed).subquery()
+
+
+async def refresh_rollups(db: AsyncSession, keys, values=None):
+    """Recompute the district and region rollups containing the value keys that were just written.
+
+    keys is a selectable with indicator_id, oktmo and year columns, as for
+    values_crud.refresh_availability, values the table the values are read
+    from, the aggregated value table by default. Does not commit.
+    """
+    if values is None:
+        values = indicator_models.AggregatedIndicatorValue
+    rollups = indicator_models.AggregatedIndicatorRollup
+    keys = keys.where(keys.selected_columns.oktmo.isnot(None)).subquery()
+    for level in oktmo_codes.LEVELS:
+        parents = (
+            select(keys.c.indicator_id, oktmo_codes.parent(keys.c.oktmo, level).label("oktmo"), keys.c.year)
+            .where(oktmo_codes.is_below(keys.c.oktmo, level))
+            .distinct()
+            .subquery()
+        )
+        await db.execute(
+            delete(rollups).where(
+                tuple_(rollups.indicator_id, rollups.oktmo, rollups.year).in_(
+                    select(parents.c.indicator_id, parents.c.oktmo, parents.c.year)
+                )
+            )
+        )
+        children = _children(level, parents, values)
+        parent = oktmo_codes.parent(children.c.oktmo, level)
+        await db.execute(
+            insert(rollups).from_select(
+                ["indicator_id", "level", "oktmo", "year", "value", "children"],
+                select(
+                    children.c.indicator_id,
+                    literal(level, String),
+                    parent,
+                    children.c.year,
+                    func.sum(children.c.value),
+                    func.count(),
+                ).group_by(children.c.indicator_id, parent, children.c.year),
+            )
+        )
+
+
+def parents(oktmo: Optional[int]) -> list[int]:
+    """Codes of the rollups a value written for the code takes part in"""
+    if not oktmo:
+        return []
+    return [
+        oktmo_codes.parent(oktmo, level) for level in oktmo_codes.LEVELS if oktmo_codes.is_below(oktmo, level)
+    ]
+
+
+async def get_rollup_values(
+    db: AsyncSession, indicator_id: int, oktmo: Optional[int], level: str, year: Optional[int] = None
+):
+    """Returns plain rows shaped as IndicatorAggregatedResponse for the district or region containing oktmo"""
+    if not oktmo:
+        raise HTTPException(400, "OKTMO_NOT_PROVIDED")
+    rollups = indicator_models.AggregatedIndicatorRollup
+    query = (
+        select(
+            rollups.id,
+            rollups.indicator_id,
+            indicator_models.Indicator.name,
+            unit_models.Unit.unit_name.label("unit"),
+            literal(None, Integer).label("territory_id"),
+            rollups.oktmo,
+            rollups.year,
+            literal(ROLLUP_SOURCE, String).label("source"),
+            rollups.value,
+        )
+        .join(indicator_models.Indicator, indicator_models.Indicator.id == rollups.indicator_id)
+        .join(unit_models.Unit, unit_models.Unit.id == indicator_models.Indicator.unit_id)
+        .where(
+            rollups.indicator_id == indicator_id,
+            rollups.level == level,
+            rollups.oktmo == oktmo_codes.parent(oktmo, level),
+        )
+        .order_by(rollups.year)
+    )
+    if year:
+        query = query.where(rollups.year == year)
+    result = await db.execute(query)
+    return result.mappings().all()
@@ -1,5 +1,9 @@
+from typing import Optional
+
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from app.core.catalog import catalog
 from app.models.unit import Unit
 from app.schemas.unit import UnitCreateRequest
 
@@ -10,17 +14,37 @@ async def get_unit(db: AsyncSession, unit_id: int) -> Unit:
 
 
 async def create_unit(db: AsyncSession, unit: UnitCreateRequest) -> Unit:
-    existent_units = await db.execute(select(Unit).filter(Unit.name == unit.name))
+    existent_units = await db.execute(select(Unit).filter(Unit.unit_name == unit.unit_name))
     existent_unit = existent_units.scalars().first()
     if existent_unit:
         return existent_unit
-    db_unit = Unit(name=unit.name)
+    db_unit = Unit(unit_name=unit.unit_name)
     db.add(db_unit)
     await db.commit()
     await db.refresh(db_unit)
+    catalog.invalidate_unit(db_unit.id)
     return db_unit
 
 
-async def get_units(db: AsyncSession, skip: int = 0, limit: int = 10) -> Unit:
-    result = await db.execute(select(Unit).offset(skip).limit(limit))
+async def get_units(
+    db: AsyncSession,
+    limit: int = 10,
+    after: Optional[list] = None,
+    order_by: str = "id",
+    name_prefix: Optional[str] = None,
+    skip: int = 0,
+) -> list[Unit]:
+    """Keyset page of units ordered by id or by (unit_name, id), see crud.indicator.get_indicators"""
+    query = select(Unit)
+    if name_prefix:
+        query = query.where(Unit.unit_name >= name_prefix, Unit.unit_name.startswith(name_prefix, autoescape=True))
+    if order_by == "unit_name":
+        if after is not None:
+            query = query.where(Unit.unit_name >= after[0], tuple_(Unit.unit_name, Unit.id) > tuple_(*after))
+        query = query.order_by(Unit.unit_name, Unit.id)
+    else:
+        if after is not None:
+            query = query.where(Unit.id > after[0])
+        query = query.order_by(Unit.id)
+    result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
@@ -0,0 +1,93 @@
+from typing import Optional
+
+from sqlalchemy import Integer, String, and_, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import indicator as indicator_models
+
+
+def aggregated_conflict_target(by_oktmo: bool) -> dict:
+    """Unique index to upsert against, see AggregatedIndicatorValue.__table_args__"""
+    if by_oktmo:
+        return {
+            "index_elements": ["indicator_id", "oktmo", "year"],
+            "index_where": indicator_models.AggregatedIndicatorValue.oktmo.isnot(None),
+        }
+    return {
+        "index_elements": ["indicator_id", "territory_id", "year"],
+        "index_where": indicator_models.AggregatedIndicatorValue.oktmo.is_(None),
+    }
+
+
+def detailed_conflict_target(by_oktmo: bool) -> dict:
+    """Unique index to upsert against, see DetailedIndicatorValue.__table_args__"""
+    if by_oktmo:
+        return {
+            "index_elements": ["indicator_id", "oktmo", "year", "source", "age_start", "age_end"],
+            "index_where": indicator_models.DetailedIndicatorValue.oktmo.isnot(None),
+        }
+    return {
+        "index_elements": ["indicator_id", "territory_id", "year", "source", "age_start", "age_end"],
+        "index_where": indicator_models.DetailedIndicatorValue.oktmo.is_(None),
+    }
+
+
+def matching_keys(keys, by_oktmo: bool):
+    """The keys of a refresh keyed by oktmo or by territory_id, as a subquery for key_matches"""
+    keys = keys.where(keys.selected_columns.oktmo.isnot(None) if by_oktmo else keys.selected_columns.oktmo.is_(None))
+    return keys.distinct().subquery()
+
+
+def key_matches(table, keys, by_oktmo: bool) -> list:
+    """Conditions matching the rows of table to matching_keys the same way the loads upsert them"""
+    conditions = [table.indicator_id == keys.c.indicator_id, table.year == keys.c.year]
+    if by_oktmo:
+        conditions.append(table.oktmo == keys.c.oktmo)
+    else:
+        conditions.extend([table.territory_id == keys.c.territory_id, table.oktmo.is_(None)])
+    return conditions
+
+
+async def refresh_availability(db: AsyncSession, kind: str, keys, by_oktmo: bool, model=None):
+    """Rebuild the availability of the value keys that were just written.
+
+    keys is a selectable with indicator_id, territory_id, oktmo and year
+    columns. Keys are matched on oktmo or on territory_id (for values without
+    oktmo) the same way the loads upsert them. model is the table the values
+    are read from, the value table of the kind by default.
+    """
+    if model is None:
+        model = (
+            indicator_models.AggregatedIndicatorValue
+            if kind == indicator_models.AGGREGATED
+            else indicator_models.DetailedIndicatorValue
+        )
+    availability = indicator_models.IndicatorValueAvailability
+    keys = matching_keys(keys, by_oktmo)
+    await db.execute(
+        delete(availability).where(
+            availability.kind == kind,
+            select(1).select_from(keys).where(*key_matches(availability, keys, by_oktmo)).exists(),
+        )
+    )
+    await db.execute(
+        insert(availability)
+        .from_select(
+            ["indicator_id", "kind", "year", "territory_id", "oktmo", "source"],
+            select(model.indicator_id, literal(kind, String), model.year, model.territory_id, model.oktmo, model.source)
+            .join(keys, and_(*key_matches(model, keys, by_oktmo)))
+            .distinct(),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def written_keys(indicator_id: int, territory_id: Optional[int], oktmo: Optional[int], years: list[int]):
+    rows = func.unnest(literal(years, ARRAY(Integer))).table_valued("year").render_derived()
+    return select(
+        literal(indicator_id, Integer).label("indicator_id"),
+        literal(territory_id, Integer).label("territory_id"),
+        literal(oktmo, Integer).label("oktmo"),
+        rows.c.year,
+    )
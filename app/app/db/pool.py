@@ -0,0 +1,58 @@
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolWaits:
+    """Time spent by requests waiting for a pooled connection"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long every checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = PoolWaits()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.waits.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.waits.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # the waits survive engine.dispose(), they describe the process, not the pool instance
+        pool = super().recreate()
+        pool.waits = self.waits
+        return pool
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "timeout": self._timeout,
+            "checkouts": self.waits.checkouts,
+            "timeouts": self.waits.timeouts,
+            "total_wait_seconds": self.waits.total_wait,
+            "max_wait_seconds": self.waits.max_wait,
+        }
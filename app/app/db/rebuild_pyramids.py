@@ -0,0 +1,22 @@
+"""Rebuilds the detailed pyramids from the rows layout.
+
+The loads keep the pyramids in sync only while detailed_storage is arrays,
+so run this right before switching it to arrays, with the loads stopped:
+
+    python -m app.db.rebuild_pyramids
+"""
+import asyncio
+
+from app.crud import pyramids as pyramid_crud
+from app.db.session import SessionLocal, engine
+
+
+async def main():
+    async with SessionLocal() as db:
+        await pyramid_crud.rebuild_from_rows(db)
+        await db.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,123 @@
+import logging
+import time
+
+from fastapi import Request
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db.pool import TimedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# requests sending this header read from the primary, e.g. right after their own write
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
 
-engine = create_async_engine(settings.database_url, echo=True)
+def _create_engine(url: str):
+    return create_async_engine(
+        url,
+        echo=settings.db_echo,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={"prepared_statement_cache_size": settings.db_statement_cache_size},
+    )
+
+
+engine = _create_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
+read_engine = _create_engine(settings.read_database_url) if settings.read_database_url else None
+_replica_down_until = 0.0
+
+
+def _replica_failed():
+    global _replica_down_until
+    logger.exception("Read replica unavailable, reading from the primary")
+    _replica_down_until = time.monotonic() + settings.read_replica_retry_after
+
+
+def _connection_lost(error: Exception) -> bool:
+    """Whether a statement failed because of the connection rather than the statement itself"""
+    if isinstance(error, (OSError, InterfaceError, OperationalError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class ReplicaSession(AsyncSession):
+    """Session on the replica that moves to the primary when the replica connection fails.
+
+    The failed statement is run again on the primary, a statement failing on
+    the primary as well raises. Errors of the statement itself, e.g. a value
+    out of range, are raised as they are. Sessions only read, so nothing is
+    lost by closing the replica transaction.
+    """
+
+    async def _falling_back(self, method, *args, **kwargs):
+        if self.bind is not read_engine:
+            return await method(*args, **kwargs)
+        try:
+            return await method(*args, **kwargs)
+        except Exception as e:
+            if not _connection_lost(e):
+                raise
+            _replica_failed()
+            await self.close()
+            self.bind = engine
+            self.sync_session.bind = engine.sync_engine
+            return await method(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._falling_back(super().execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._falling_back(super().scalar, *args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        return await self._falling_back(super().stream, *args, **kwargs)
+
+
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine, class_=ReplicaSession) if read_engine else None
+)
+
 
 async def get_db():
     async with SessionLocal() as session:
         yield session
+
+
+async def open_read_session(read_your_writes: bool = False) -> AsyncSession:
+    """Session on the replica, or on the primary when there is none, it is down or the caller needs its own writes.
+
+    The replica connection is checked out right away so that a replica that
+    cannot be reached falls back before any query runs.
+    """
+    if ReadSessionLocal is None or read_your_writes or time.monotonic() < _replica_down_until:
+        return SessionLocal()
+    session = ReadSessionLocal()
+    try:
+        await session.connection()
+    except (OSError, SQLAlchemyError):
+        _replica_failed()
+        await session.close()
+        return SessionLocal()
+    return session
+
+
+def on_replica(db: AsyncSession) -> bool:
+    """Whether the session reads from the replica, whose rows may lag behind the primary"""
+    return read_engine is not None and db.bind is read_engine
+
+
+def wants_own_writes(request: Request) -> bool:
+    return request.headers.get(READ_YOUR_WRITES_HEADER, "").lower() in ("1", "true", "yes")
+
+
+async def get_read_db(request: Request):
+    async with await open_read_session(wants_own_writes(request)) as session:
+        yield session
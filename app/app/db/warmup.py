@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from app.core.catalog import catalog
+from app.core.config import settings
+from app.crud import indicator as indicator_crud
+from app.db.session import SessionLocal, engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+# the reads behind the busiest endpoints, for both territory keys, with ids that match no rows
+HOT_STATEMENTS = (
+    lambda db: indicator_crud.get_indicators(db),
+    lambda db: indicator_crud.get_aggregated_indicator_values(db, -1, None, -1),
+    lambda db: indicator_crud.get_aggregated_indicator_values(db, -1, -1, None),
+    lambda db: indicator_crud.get_detailed_indicator_rows(db, -1, None, -1),
+    lambda db: indicator_crud.get_detailed_indicator_rows(db, -1, -1, None),
+    lambda db: indicator_crud.get_aggregated_indicator_values_availability(db, -1),
+    lambda db: indicator_crud.get_detailed_indicator_values_availability(db, -1),
+)
+
+
+async def _prepare(connection: AsyncConnection):
+    # asyncpg prepares and caches a statement per connection the first time it runs
+    async with AsyncSession(bind=connection) as db:
+        for statement in HOT_STATEMENTS:
+            await statement(db)
+        await db.rollback()
+
+
+async def open_connections(warm_engine: AsyncEngine, count: int):
+    """Opens count pooled connections at once and prepares the hot statements on each.
+
+    The connections go back to the pool afterwards, only pool_size of them
+    are kept, the overflow is closed.
+    """
+    connections = await asyncio.gather(
+        *(warm_engine.connect().start() for _ in range(count)), return_exceptions=True
+    )
+    opened = [connection for connection in connections if isinstance(connection, AsyncConnection)]
+    try:
+        if len(opened) < len(connections):
+            raise next(connection for connection in connections if isinstance(connection, BaseException))
+        await asyncio.gather(*(_prepare(connection) for connection in opened))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in opened), return_exceptions=True)
+
+
+async def warm_up() -> float:
+    """Preloads the catalog and warms the primary and replica pools, returns the seconds it took.
+
+    Failures are logged and skipped, what is not warmed up is set up by the first requests instead.
+    """
+    start = time.perf_counter()
+    try:
+        async with SessionLocal() as db:
+            await catalog.preload(db)
+    except Exception:
+        # the catalog fills up lazily, the service can start without it
+        logger.exception("Catalog preload failed")
+    for name, warm_engine in (("primary", engine), ("replica", read_engine)):
+        if warm_engine is None:
+            continue
+        try:
+            await open_connections(warm_engine, min(settings.db_warmup_connections, settings.db_pool_size))
+        except Exception:
+            logger.exception("Warm-up of the %s pool failed", name)
+    return time.perf_counter() - start
@@ -1,7 +1,13 @@
 from app import app
-from app.api.endpoints import units, indicators
+from app.api.endpoints import units, indicators, bulk, export, derived, jobs, metrics, status
 
 
 app.include_router(indicators.router, prefix="/indicators", tags=["indicators"])
+app.include_router(bulk.router, prefix="/bulk", tags=["bulk"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(export.router, prefix="/export", tags=["export"])
+app.include_router(derived.router, prefix="/derived", tags=["derived"])
 # app.include_router(population.router, prefix="/population", tags=["population"])
 app.include_router(units.router, prefix="/units", tags=["units"])
+app.include_router(status.router, prefix="/status", tags=["status"])
+app.include_router(metrics.router, prefix="/metrics", tags=["status"])
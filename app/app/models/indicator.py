@@ -1,9 +1,9 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, Float, UniqueConstraint
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, Float, UniqueConstraint, Index, Boolean, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import CheckConstraint
 from sqlalchemy.ext.hybrid import hybrid_property
 from .base import metadata, Base
-from app.crud.unit import get_unit
 
 
 class Indicator(Base):
@@ -17,22 +17,53 @@ class Indicator(Base):
 
 class AggregatedIndicatorValue(Base):
     __tablename__ = "aggregated_indicator_values"
-    id = Column(Integer, primary_key=True, index=True)
-    indicator_id = Column(Integer, ForeignKey("indicators.id"), index=True, unique=False)
-    territory_id = Column(Integer, nullable=False, index=True, unique=False)
-    year = Column(Integer, nullable=False, index=True, unique=False)
+    # partitioned by year, the partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), unique=False)
+    territory_id = Column(Integer, nullable=True, index=True, unique=False)
+    year = Column(Integer, primary_key=True, nullable=False, index=True, unique=False)
     value = Column(Float, nullable=False)
     source = Column(String, nullable=False)
     indicator = relationship("Indicator")
     oktmo = Column(Integer, nullable=True)
 
+    # Values are keyed by oktmo when it is known and by territory_id otherwise,
+    # the unique indexes are the conflict targets of the upsert in crud.indicator
+    # and the covering ones serve the reads
+    __table_args__ = (
+        Index(
+            "ix_aggregated_indicator_values_indicator_territory_year",
+            "indicator_id", "territory_id", "year",
+            postgresql_include=["oktmo", "value", "source"],
+        ),
+        Index(
+            "ix_aggregated_indicator_values_indicator_oktmo_year",
+            "indicator_id", "oktmo", "year",
+            postgresql_include=["territory_id", "value", "source"],
+        ),
+        Index(
+            "ux_aggregated_indicator_values_oktmo",
+            "indicator_id", "oktmo", "year",
+            unique=True,
+            postgresql_where=oktmo.isnot(None),
+        ),
+        Index(
+            "ux_aggregated_indicator_values_territory_id",
+            "indicator_id", "territory_id", "year",
+            unique=True,
+            postgresql_where=oktmo.is_(None),
+        ),
+        {"postgresql_partition_by": "RANGE (year)"},
+    )
+
 
 class DetailedIndicatorValue(Base):
     __tablename__ = "detailed_indicator_values"
-    id = Column(Integer, primary_key=True, index=True)
-    indicator_id = Column(Integer, ForeignKey("indicators.id"), index=True, unique=False)
-    territory_id = Column(Integer, nullable=False, index=True, unique=False)
-    year = Column(Integer, nullable=False, index=True, unique=False)
+    # partitioned by year, the partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), unique=False)
+    territory_id = Column(Integer, nullable=True, index=True, unique=False)
+    year = Column(Integer, primary_key=True, nullable=False, index=True, unique=False)
     age_start = Column(Integer, nullable=True)
     age_end = Column(Integer, nullable=True)
     source = Column(String, nullable=False)
@@ -41,7 +72,154 @@ class DetailedIndicatorValue(Base):
     female = Column(Float, nullable=True)
     oktmo = Column(Integer, nullable=True)
 
+    # an age band is identified by both bounds, an open-ended band has age_end = NULL
     __table_args__ = (
         # CheckConstraint('coalesce(male , female ) is not null'),
         CheckConstraint('coalesce(age_start , age_end ) is not null'),
+        Index(
+            "ix_detailed_indicator_values_indicator_territory_year_age",
+            "indicator_id", "territory_id", "year", "age_start",
+            postgresql_include=["oktmo", "age_end", "source", "male", "female"],
+        ),
+        Index(
+            "ix_detailed_indicator_values_indicator_oktmo_year_age",
+            "indicator_id", "oktmo", "year", "age_start",
+            postgresql_include=["territory_id", "age_end", "source", "male", "female"],
+        ),
+        Index(
+            "ux_detailed_indicator_values_oktmo",
+            "indicator_id", "oktmo", "year", "source", "age_start", "age_end",
+            unique=True,
+            postgresql_where=oktmo.isnot(None),
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index(
+            "ux_detailed_indicator_values_territory_id",
+            "indicator_id", "territory_id", "year", "source", "age_start", "age_end",
+            unique=True,
+            postgresql_where=oktmo.is_(None),
+            postgresql_nulls_not_distinct=True,
+        ),
+        {"postgresql_partition_by": "RANGE (year)"},
         )
+
+
+class DetailedIndicatorPyramid(Base):
+    """Whole pyramid of an (indicator, territory, year, source) in one row, bands as parallel arrays sorted by age.
+
+    Copy of DetailedIndicatorValue read and kept in sync by the detailed loads with settings.detailed_storage = arrays.
+    """
+    __tablename__ = "detailed_indicator_pyramids"
+    id = Column(Integer, primary_key=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=False)
+    territory_id = Column(Integer, nullable=True)
+    oktmo = Column(Integer, nullable=True)
+    year = Column(Integer, nullable=False)
+    source = Column(String, nullable=False)
+    # age_end elements are NULL for the open-ended band
+    age_start = Column(ARRAY(Integer), nullable=False)
+    age_end = Column(ARRAY(Integer), nullable=False)
+    male = Column(ARRAY(Float), nullable=False)
+    female = Column(ARRAY(Float), nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ux_detailed_indicator_pyramids_oktmo",
+            "indicator_id", "oktmo", "year", "source",
+            unique=True,
+            postgresql_where=oktmo.isnot(None),
+        ),
+        Index(
+            "ux_detailed_indicator_pyramids_territory_id",
+            "indicator_id", "territory_id", "year", "source",
+            unique=True,
+            postgresql_where=oktmo.is_(None),
+        ),
+    )
+
+
+# Years that get a partition of their own when the value tables are created,
+# values of other years go to the default partition until
+# crud.partitions.create_year_partition is called for them
+PARTITION_YEARS = range(1990, 2051)
+
+
+def _create_year_partitions(table, connection, **kwargs):
+    for year in PARTITION_YEARS:
+        connection.execute(
+            text(
+                f"CREATE TABLE {table.name}_y{year} PARTITION OF {table.name} "
+                f"FOR VALUES FROM ({year}) TO ({year + 1})"
+            )
+        )
+    connection.execute(text(f"CREATE TABLE {table.name}_default PARTITION OF {table.name} DEFAULT"))
+
+
+event.listen(AggregatedIndicatorValue.__table__, "after_create", _create_year_partitions)
+event.listen(DetailedIndicatorValue.__table__, "after_create", _create_year_partitions)
+
+
+AGGREGATED = "aggregated"
+DETAILED = "detailed"
+
+
+class IndicatorValueAvailability(Base):
+    """Distinct (year, territory_id, oktmo, source) of the values of an indicator, maintained by the loads"""
+    __tablename__ = "indicator_value_availability"
+    id = Column(Integer, primary_key=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    territory_id = Column(Integer, nullable=True)
+    oktmo = Column(Integer, nullable=True)
+    source = Column(String, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint(f"kind IN ('{AGGREGATED}', '{DETAILED}')"),
+        Index(
+            "ux_indicator_value_availability",
+            "indicator_id", "kind", "year", "territory_id", "oktmo", "source",
+            unique=True,
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+
+class DerivedIndicator(Base):
+    """Indicator computed from the aggregated values of other indicators by an arithmetic expression"""
+    __tablename__ = "derived_indicators"
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), primary_key=True)
+    expression = Column(String, nullable=False)
+    variables = Column(JSONB, nullable=False)
+    input_ids = Column(ARRAY(Integer), nullable=False)
+    materialized = Column(Boolean, nullable=False, default=False)
+    indicator = relationship("Indicator")
+
+    __table_args__ = (
+        Index("ix_derived_indicators_input_ids", "input_ids", postgresql_using="gin"),
+    )
+
+
+class AggregatedIndicatorRollup(Base):
+    """Sum of the aggregated values of an indicator over the territories inside an OKTMO district or region.
+
+    Maintained by the loads, see crud.rollup.
+    """
+    __tablename__ = "aggregated_indicator_rollups"
+    id = Column(Integer, primary_key=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=False)
+    level = Column(String, nullable=False)
+    oktmo = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False)
+    value = Column(Float, nullable=False)
+    children = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("level IN ('district', 'region')"),
+        Index(
+            "ux_aggregated_indicator_rollups",
+            "indicator_id", "oktmo", "year",
+            unique=True,
+            postgresql_include=["level", "value", "children"],
+        ),
+    )
@@ -1,9 +1,9 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.schemas.unit import UnitResponse
+from app.core.gapfill import FillMethod
 from app.models.base import metadata
 from app.models.unit import Unit
-from app.crud.unit import get_unit
 
 # from sqlalchemy.ext.hybrid import hybrid_property
 
@@ -72,6 +72,12 @@ class IndicatorAggregatedResponse(BaseModel):
     value: float
 
 
+class IndicatorAggregatedFilledResponse(IndicatorAggregatedResponse):
+    """A point of a gap-filled series, imputed points have no id"""
+    id: Optional[int] = None
+    imputed: bool
+
+
 class IndicatorDetailedData(BaseModel):
     age_start: int
     age_end: int | None
@@ -100,3 +106,55 @@ class IndicatorUniqueDetailedPair(BaseModel):
     
     def __hash__(self):
         return hash(self.year) + hash(self.source)
+
+
+class BulkLoadResponse(BaseModel):
+    rows_received: int
+    rows_merged: int
+
+
+class IndicatorMatrixRequest(BaseModel):
+    indicator_ids: List[int]
+    territory_ids: Optional[List[int]] = None
+    oktmo: Optional[List[int]] = None
+    year_from: int
+    year_to: int
+    fill: Optional[FillMethod] = None
+
+
+class IndicatorMatrixResponse(BaseModel):
+    """Dense aggregated values, values[(i * territories + t) * years + y] is null where nothing is stored.
+
+    With fill, imputed has the same layout and marks the interpolated cells.
+    """
+    indicator_ids: List[int]
+    territory_ids: Optional[List[int]] = None
+    oktmo: Optional[List[int]] = None
+    years: List[int]
+    values: List[Optional[float]]
+    imputed: Optional[List[bool]] = None
+
+
+class DerivedIndicatorCreateRequest(BaseModel):
+    name: str
+    unit_id: int
+    expression: str
+    variables: Dict[str, int]
+    materialized: bool = False
+
+
+class DerivedIndicatorResponse(BaseModel):
+    id: int
+    name: str
+    unit_name: str
+    expression: str
+    variables: Dict[str, int]
+    materialized: bool
+
+
+class DerivedIndicatorValue(BaseModel):
+    indicator_id: int
+    territory_id: Optional[int] = None
+    oktmo: Optional[int] = None
+    year: int
+    value: float
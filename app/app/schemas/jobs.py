@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+
+class JobResponse(BaseModel):
+    """State of an ingestion job, throughput is processed rows per second of running time"""
+    id: str
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows_processed: int
+    rows_failed: int
+    rows_merged: Optional[int] = None
+    throughput: Optional[float] = None
+    error: Optional[str] = None
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class PoolStatsResponse(BaseModel):
+    """Connection pool state, counters accumulate since the process started"""
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    timeout: float
+    checkouts: int
+    timeouts: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    warmup_seconds: Optional[float] = None
@@ -0,0 +1,101 @@
+"""Compare the per-item and the set-based load of aggregated indicator values.
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.aggregated_upsert --territories 2000 --years 30
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import indicator as indicator_crud
+from app.models import indicator as indicator_models
+from app.schemas import indicator as schemas
+from benchmarks.common import (
+    create_benchmark_engine,
+    create_indicator,
+    create_session_factory,
+    report,
+    reset_schema,
+    timer,
+)
+
+
+async def legacy_create_aggregated_indicator_values(
+    db: AsyncSession,
+    indicator_id: int,
+    territory_id: Optional[int],
+    oktmo: Optional[int],
+    indicator_values: list[schemas.LoadIndicatorAggregatedRequest],
+):
+    """The per-item SELECT + UPDATE/INSERT loop replaced by the set-based upsert"""
+    model = indicator_models.AggregatedIndicatorValue
+    for indicator_value in indicator_values:
+        query = select(model).where(model.indicator_id == indicator_id, model.year == indicator_value.year)
+        if oktmo:
+            query = query.where(model.oktmo == oktmo)
+        else:
+            query = query.where(model.territory_id == territory_id)
+        result = await db.execute(query)
+        if result.scalars().all():
+            query = update(model).where(model.indicator_id == indicator_id, model.year == indicator_value.year)
+            if oktmo:
+                query = query.where(model.oktmo == oktmo)
+            else:
+                query = query.where(model.territory_id == territory_id)
+            await db.execute(query.values(value=indicator_value.value, source=indicator_value.source))
+        else:
+            db.add(
+                model(
+                    indicator_id=indicator_id,
+                    territory_id=territory_id,
+                    oktmo=oktmo,
+                    year=indicator_value.year,
+                    value=indicator_value.value,
+                    source=indicator_value.source,
+                )
+            )
+    await db.commit()
+
+
+async def load(session_factory, loader, indicator_id: int, territories: int, years: int):
+    payload = [
+        schemas.LoadIndicatorAggregatedRequest(year=2000 + year, value=float(year), source="benchmark")
+        for year in range(years)
+    ]
+    async with session_factory() as session:
+        for territory_id in range(1, territories + 1):
+            await loader(session, indicator_id, territory_id, None, payload)
+
+
+async def main(territories: int, years: int):
+    engine = create_benchmark_engine()
+    session_factory = create_session_factory(engine)
+    results = {"territories": territories, "years": years}
+    for name, loader in (
+        ("legacy", legacy_create_aggregated_indicator_values),
+        ("upsert", indicator_crud.create_aggregated_indicator_values),
+    ):
+        await reset_schema(engine)
+        async with session_factory() as session:
+            indicator_id = await create_indicator(session)
+        # the first pass inserts every value, the second one updates them
+        with timer(results, f"{name}_insert_seconds"):
+            await load(session_factory, loader, indicator_id, territories, years)
+        with timer(results, f"{name}_update_seconds"):
+            await load(session_factory, loader, indicator_id, territories, years)
+        async with session_factory() as session:
+            results[f"{name}_rows"] = await session.scalar(
+                select(func.count()).select_from(indicator_models.AggregatedIndicatorValue)
+            )
+    await engine.dispose()
+    report("aggregated_upsert", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--territories", type=int, default=200)
+    parser.add_argument("--years", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(main(args.territories, args.years))
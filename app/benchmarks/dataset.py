@@ -0,0 +1,157 @@
+"""Generate a synthetic dataset shaped like production data into the benchmark database.
+
+Territories are OKTMO-like codes: regions, districts in each region and
+settlements in each district, every fourth district is an urban okrug
+without settlements. Aggregated values cover every territory and year,
+pyramids one-year age bands with an open-ended last band. The random
+values are seeded, so the same arguments give the same dataset.
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.dataset --valued-indicators 20
+"""
+import argparse
+import asyncio
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import select, text
+
+from app.crud import rollup as rollup_crud, values as values_crud
+from app.models import indicator as indicator_models
+from benchmarks.common import (
+    create_benchmark_engine,
+    create_session_factory,
+    relation_bytes,
+    report,
+    reset_schema,
+    timer,
+)
+
+UNITS = 10
+
+
+@dataclass
+class DatasetParameters:
+    indicators: int = 2000
+    valued_indicators: int = 20
+    pyramid_indicators: int = 2
+    regions: int = 85
+    districts_per_region: int = 28
+    settlements_per_district: int = 8
+    pyramid_territories: int = 1000
+    first_year: int = 1994
+    years: int = 30
+    age_bands: int = 100
+    seed: float = 0.42
+
+    @property
+    def last_year(self) -> int:
+        return self.first_year + self.years - 1
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    for name, default in asdict(DatasetParameters()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+
+def parameters_from(args: argparse.Namespace) -> DatasetParameters:
+    return DatasetParameters(**{name: getattr(args, name) for name in asdict(DatasetParameters())})
+
+
+GENERATE = [
+    "INSERT INTO units (id, unit_name) SELECT u, 'unit ' || u FROM generate_series(1, :units) u",
+    """
+    INSERT INTO indicators (id, name, unit_id)
+    SELECT i, 'indicator ' || i, 1 + i % :units FROM generate_series(1, :indicators) i
+    """,
+    "SELECT setval(pg_get_serial_sequence('indicators', 'id'), :indicators)",
+    "SELECT setval(pg_get_serial_sequence('units', 'id'), :units)",
+    """
+    CREATE TABLE benchmark_territories AS
+    SELECT (row_number() OVER (ORDER BY oktmo))::int AS territory_id, oktmo
+    FROM (
+        SELECT r * 1000000 + d * 1000 + s AS oktmo
+        FROM generate_series(1, :regions) r,
+            generate_series(1, :districts_per_region) d,
+            generate_series(0, :settlements_per_district) s
+        WHERE (d % 4 = 0) = (s = 0)
+    ) codes
+    """,
+    "SELECT setseed(:seed)",
+    """
+    INSERT INTO aggregated_indicator_values (indicator_id, territory_id, oktmo, year, value, source)
+    SELECT i, t.territory_id, t.oktmo, y, round((random() * 10000)::numeric, 2), 'synthetic'
+    FROM generate_series(1, :valued_indicators) i, benchmark_territories t, generate_series(:first_year, :last_year) y
+    """,
+    """
+    INSERT INTO detailed_indicator_values
+        (indicator_id, territory_id, oktmo, year, source, age_start, age_end, male, female)
+    SELECT i, t.territory_id, t.oktmo, y, 'synthetic', a, CASE WHEN a < :age_bands - 1 THEN a END,
+        round((random() * 500)::numeric, 2), round((random() * 500)::numeric, 2)
+    FROM generate_series(:valued_indicators + 1, :valued_indicators + :pyramid_indicators) i,
+        (SELECT * FROM benchmark_territories ORDER BY territory_id LIMIT :pyramid_territories) t,
+        generate_series(:first_year, :last_year) y,
+        generate_series(0, :age_bands - 1) a
+    """,
+]
+
+
+async def territories(session) -> list[tuple[int, int]]:
+    """(territory_id, oktmo) of the generated territories"""
+    result = await session.execute(text("SELECT territory_id, oktmo FROM benchmark_territories ORDER BY territory_id"))
+    return [tuple(row) for row in result]
+
+
+async def generate(engine, parameters: DatasetParameters) -> dict:
+    """Recreate the schema and fill it, returns the timings and row counts"""
+    results = {}
+    bind = {**asdict(parameters), "last_year": parameters.last_year, "units": UNITS}
+    await reset_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS benchmark_territories"))
+        with timer(results, "generate_seconds"):
+            for statement in GENERATE:
+                statement = text(statement)
+                await conn.execute(statement, {name: bind[name] for name in statement.compile().params})
+
+    # the derived tables are built by the same code the loads use
+    session_factory = create_session_factory(engine)
+    async with session_factory() as session:
+        with timer(results, "derive_seconds"):
+            for kind, model in (
+                (indicator_models.AGGREGATED, indicator_models.AggregatedIndicatorValue),
+                (indicator_models.DETAILED, indicator_models.DetailedIndicatorValue),
+            ):
+                keys = select(model.indicator_id, model.territory_id, model.oktmo, model.year)
+                for by_oktmo in (True, False):
+                    await values_crud.refresh_availability(session, kind, keys, by_oktmo)
+            aggregated = indicator_models.AggregatedIndicatorValue
+            await rollup_crud.refresh_rollups(
+                session, select(aggregated.indicator_id, aggregated.territory_id, aggregated.oktmo, aggregated.year)
+            )
+            await session.commit()
+
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        with timer(results, "analyze_seconds"):
+            await conn.execute(text("ANALYZE"))
+        for table in (
+            "benchmark_territories",
+            indicator_models.AggregatedIndicatorValue.__tablename__,
+            indicator_models.DetailedIndicatorValue.__tablename__,
+            indicator_models.AggregatedIndicatorRollup.__tablename__,
+        ):
+            results[f"{table}_rows"] = await conn.scalar(text(f"SELECT count(*) FROM {table}"))
+            results[f"{table}_bytes"] = await relation_bytes(conn, table)
+    return results
+
+
+async def main(parameters: DatasetParameters):
+    engine = create_benchmark_engine()
+    results = await generate(engine, parameters)
+    await engine.dispose()
+    report("dataset", {**asdict(parameters), **results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    asyncio.run(main(parameters_from(parser.parse_args())))
@@ -0,0 +1,79 @@
+"""Compare the rows and the arrays layout of detailed values: storage size and pyramid read latency.
+
+Generates pyramids with benchmarks.dataset (aggregated values are left out),
+copies them into the arrays layout and times crud.indicator's detailed read
+against each layout with settings.detailed_storage switched, as well as
+the detailed load, which refreshes the arrays only in the arrays layout.
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.pyramid_storage --pyramid-territories 2000
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.crud import indicator as indicator_crud, pyramids as pyramid_crud
+from app.models import indicator as indicator_models
+from benchmarks import dataset
+from benchmarks.common import create_benchmark_engine, create_session_factory, relation_bytes, report, summarize, timer
+from benchmarks.suite import Workload
+
+LAYOUTS = {
+    "rows": indicator_models.DetailedIndicatorValue.__tablename__,
+    "arrays": indicator_models.DetailedIndicatorPyramid.__tablename__,
+}
+
+
+async def main(parameters: dataset.DatasetParameters, iterations: int):
+    engine = create_benchmark_engine()
+    session_factory = create_session_factory(engine)
+    results = await dataset.generate(engine, parameters)
+    async with session_factory() as session:
+        with timer(results, "convert_seconds"):
+            await pyramid_crud.rebuild_from_rows(session)
+            await session.commit()
+        territories = await dataset.territories(session)
+    async with engine.connect() as conn:
+        for layout, table in LAYOUTS.items():
+            results[f"{layout}_bytes"] = await relation_bytes(conn, table)
+
+    for layout in LAYOUTS:
+        settings.detailed_storage = layout
+        # the same draws for both layouts
+        workload = Workload(parameters, territories)
+        reads, single_year_reads = [], []
+        for _ in range(iterations):
+            indicator_id, (_, oktmo) = workload.pyramid_indicator_id(), workload.pyramid_territory()
+            async with session_factory() as session:
+                start = time.perf_counter()
+                await indicator_crud.get_detailed_indicator_values(session, indicator_id, None, oktmo)
+                reads.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await indicator_crud.get_detailed_indicator_values(session, indicator_id, None, oktmo, workload.year())
+                single_year_reads.append(time.perf_counter() - start)
+        results[f"{layout}_read_all_years"] = summarize(reads)
+        results[f"{layout}_read_one_year"] = summarize(single_year_reads)
+
+    for layout in LAYOUTS:
+        settings.detailed_storage = layout
+        workload, loads = Workload(parameters, territories), []
+        for _ in range(iterations):
+            indicator_id, (_, oktmo) = workload.pyramid_indicator_id(), workload.pyramid_territory()
+            async with session_factory() as session:
+                start = time.perf_counter()
+                await indicator_crud.load_detailed_indicator_values(
+                    session, indicator_id, None, oktmo, workload.detailed_payload()
+                )
+                loads.append(time.perf_counter() - start)
+        results[f"{layout}_load_pyramid"] = summarize(loads)
+    await engine.dispose()
+    report("pyramid_storage", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    dataset.add_arguments(parser)
+    parser.set_defaults(valued_indicators=0, indicators=10)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(dataset.parameters_from(args), args.iterations))
@@ -0,0 +1,55 @@
+"""Encoding time of a large aggregated values body, schema validation against FAST_JSON.
+
+Needs no database, the rows are built in memory with the shape the CRUD query returns.
+
+    python -m benchmarks.serialization --rows 50000
+"""
+import argparse
+import random
+import time
+
+from app.api.endpoints.indicators import aggregated_values_serializer
+from app.core.config import settings
+from benchmarks.common import report, summarize
+
+
+def rows(count: int) -> list[dict]:
+    generator = random.Random(1)
+    return [
+        dict(
+            id=i,
+            indicator_id=1,
+            name="benchmark",
+            unit="benchmark unit",
+            territory_id=None,
+            oktmo=45000000 + i // 30,
+            year=1994 + i % 30,
+            source="synthetic",
+            value=generator.random() * 10000,
+        )
+        for i in range(count)
+    ]
+
+
+def main(count: int, iterations: int):
+    values = rows(count)
+    results = {"rows": count}
+    bodies = {}
+    for fast_json in (False, True):
+        settings.fast_json = fast_json
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            bodies[fast_json] = aggregated_values_serializer.dump_json(values)
+            samples.append(time.perf_counter() - start)
+        results["fast_json" if fast_json else "validated"] = summarize(samples)
+    results["same_body"] = bodies[False] == bodies[True]
+    report("serialization", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    main(args.rows, args.iterations)
@@ -0,0 +1,259 @@
+"""Benchmark every CRUD function in crud.indicator and the HTTP endpoints on a synthetic dataset.
+
+Generates the dataset (see benchmarks.dataset) unless --skip-generate is
+given, times each CRUD function in-process and then puts the running
+service under concurrent load. The service at --base-url has to use the
+benchmark database, pass --skip-http to leave it out. Results are written
+as JSON named after the current commit so runs can be compared.
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.suite --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.crud import indicator as indicator_crud
+from app.schemas import indicator as schemas
+from benchmarks import dataset
+from benchmarks.common import create_benchmark_engine, create_session_factory, git_revision, summarize
+
+RESULTS_DIRECTORY = Path(__file__).parent / "results"
+
+
+class Workload:
+    """Random but reproducible arguments drawn from the generated dataset"""
+
+    def __init__(self, parameters: dataset.DatasetParameters, territories: list[tuple[int, int]], seed: int = 1):
+        self.parameters = parameters
+        self.territories = territories
+        self.random = random.Random(seed)
+
+    def indicator_id(self) -> int:
+        return self.random.randint(1, self.parameters.valued_indicators)
+
+    def pyramid_indicator_id(self) -> int:
+        return self.parameters.valued_indicators + self.random.randint(1, self.parameters.pyramid_indicators)
+
+    def territory(self) -> tuple[int, int]:
+        return self.random.choice(self.territories)
+
+    def pyramid_territory(self) -> tuple[int, int]:
+        return self.random.choice(self.territories[: self.parameters.pyramid_territories])
+
+    def year(self) -> int:
+        return self.random.randint(self.parameters.first_year, self.parameters.last_year)
+
+    def aggregated_payload(self) -> list[schemas.LoadIndicatorAggregatedRequest]:
+        return [
+            schemas.LoadIndicatorAggregatedRequest(year=year, value=self.random.random() * 10000, source="benchmark")
+            for year in range(self.parameters.first_year, self.parameters.last_year + 1)
+        ]
+
+    def detailed_payload(self) -> schemas.LoadIndicatorDetailedRequest:
+        bands = self.parameters.age_bands
+        return schemas.LoadIndicatorDetailedRequest(
+            year=self.year(),
+            source="synthetic",
+            data=[
+                schemas.IndicatorDetailedData(
+                    age_start=age,
+                    age_end=age if age < bands - 1 else None,
+                    male=self.random.random() * 500,
+                    female=self.random.random() * 500,
+                )
+                for age in range(bands)
+            ],
+        )
+
+
+def crud_cases(workload: Workload) -> dict[str, Callable[..., Awaitable]]:
+    async def stream_aggregated_indicator_values(db):
+        async for _ in indicator_crud.stream_aggregated_indicator_values(db, workload.indicator_id(), None, 1000):
+            pass
+
+    async def create_indicator(db):
+        name = f"benchmark {workload.random.getrandbits(64)}"
+        await indicator_crud.create_indicator(db, schemas.IndicatorCreateRequest(name=name, unit_id=1))
+
+    return {
+        "get_indicators": lambda db: indicator_crud.get_indicators(db, limit=100),
+        "get_indicators_by_name_prefix": lambda db: indicator_crud.get_indicators(
+            db, limit=100, order_by="name", name_prefix="indicator 1"
+        ),
+        "get_indicator": lambda db: indicator_crud.get_indicator(db, workload.indicator_id()),
+        "create_indicator": create_indicator,
+        "get_aggregated_indicator_values_availability": lambda db: (
+            indicator_crud.get_aggregated_indicator_values_availability(db, workload.indicator_id())
+        ),
+        "get_detailed_indicator_values_availability": lambda db: (
+            indicator_crud.get_detailed_indicator_values_availability(db, workload.pyramid_indicator_id())
+        ),
+        "get_aggregated_indicator_values_by_oktmo": lambda db: indicator_crud.get_aggregated_indicator_values(
+            db, workload.indicator_id(), None, workload.territory()[1]
+        ),
+        "get_aggregated_indicator_values_by_territory_id": lambda db: indicator_crud.get_aggregated_indicator_values(
+            db, workload.indicator_id(), workload.territory()[0], None, workload.year()
+        ),
+        "create_aggregated_indicator_values": lambda db: indicator_crud.create_aggregated_indicator_values(
+            db, workload.indicator_id(), None, workload.territory()[1], workload.aggregated_payload()
+        ),
+        "stream_aggregated_indicator_values": stream_aggregated_indicator_values,
+        "get_aggregated_indicator_values_matrix": lambda db: indicator_crud.get_aggregated_indicator_values_matrix(
+            db,
+            schemas.IndicatorMatrixRequest(
+                indicator_ids=[workload.indicator_id() for _ in range(5)],
+                oktmo=[workload.territory()[1] for _ in range(200)],
+                year_from=workload.parameters.first_year,
+                year_to=workload.parameters.last_year,
+            ),
+        ),
+        "get_detailed_indicator_values": lambda db: indicator_crud.get_detailed_indicator_values(
+            db, workload.pyramid_indicator_id(), None, workload.pyramid_territory()[1]
+        ),
+        "load_detailed_indicator_values": lambda db: indicator_crud.load_detailed_indicator_values(
+            db, workload.pyramid_indicator_id(), None, workload.pyramid_territory()[1], workload.detailed_payload()
+        ),
+    }
+
+
+async def run_crud(session_factory, workload: Workload, iterations: int) -> dict:
+    results = {}
+    for name, case in crud_cases(workload).items():
+        samples = []
+        for _ in range(iterations):
+            async with session_factory() as db:
+                start = time.perf_counter()
+                await case(db)
+                samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+        print(f"crud {name}: p50 {results[name]['p50'] * 1000:.1f} ms")
+    return results
+
+
+def http_cases(workload: Workload) -> dict[str, Callable[[], dict]]:
+    """Request arguments for httpx.AsyncClient.request per endpoint"""
+    first_year, last_year = workload.parameters.first_year, workload.parameters.last_year
+    return {
+        "GET /indicators/": lambda: {"method": "GET", "url": "/indicators/", "params": {"limit": 100}},
+        "GET /indicators/{indicator_id}": lambda: {
+            "method": "GET",
+            "url": f"/indicators/{workload.indicator_id()}",
+            "params": {"oktmo": workload.territory()[1]},
+        },
+        "GET /indicators/{indicator_id}/aggregated": lambda: {
+            "method": "GET",
+            "url": f"/indicators/{workload.indicator_id()}/aggregated",
+            "params": {"oktmo": workload.territory()[1]},
+        },
+        "GET /indicators/{indicator_id}/aggregated?aggregate_to=region": lambda: {
+            "method": "GET",
+            "url": f"/indicators/{workload.indicator_id()}/aggregated",
+            "params": {"oktmo": workload.territory()[1], "aggregate_to": "region"},
+        },
+        "GET /indicators/{indicator_id}/aggregated?fill=linear": lambda: {
+            "method": "GET",
+            "url": f"/indicators/{workload.indicator_id()}/aggregated",
+            "params": {"territory_id": workload.territory()[0], "fill": "linear"},
+        },
+        "POST /indicators/{indicator_id}/aggregated": lambda: {
+            "method": "POST",
+            "url": f"/indicators/{workload.indicator_id()}/aggregated",
+            "params": {"oktmo": workload.territory()[1]},
+            "json": [value.model_dump() for value in workload.aggregated_payload()],
+        },
+        "POST /indicators/matrix": lambda: {
+            "method": "POST",
+            "url": "/indicators/matrix",
+            "json": {
+                "indicator_ids": [workload.indicator_id() for _ in range(5)],
+                "oktmo": [workload.territory()[1] for _ in range(200)],
+                "year_from": first_year,
+                "year_to": last_year,
+            },
+        },
+        "GET /indicators/{indicator_id}/{territory_id}/detailed": lambda: {
+            "method": "GET",
+            "url": f"/indicators/{workload.pyramid_indicator_id()}/0/detailed",
+            "params": {"oktmo": workload.pyramid_territory()[1]},
+        },
+        "POST /indicators/{indicator_id}/{territory_id}/detailed": lambda: {
+            "method": "POST",
+            "url": f"/indicators/{workload.pyramid_indicator_id()}/0/detailed",
+            "params": {"oktmo": workload.pyramid_territory()[1]},
+            "json": workload.detailed_payload().model_dump(),
+        },
+        "GET /units/": lambda: {"method": "GET", "url": "/units/", "params": {"limit": 100}},
+    }
+
+
+async def run_http(base_url: str, workload: Workload, requests: int, concurrency: int) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for name, case in http_cases(workload).items():
+            samples, statuses = [], {}
+            remaining = iter(range(requests))
+
+            async def worker():
+                for _ in remaining:
+                    start = time.perf_counter()
+                    response = await client.request(**case())
+                    samples.append(time.perf_counter() - start)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            throughput = len(samples) / elapsed
+            results[name] = {**summarize(samples), "requests_per_second": throughput, "statuses": statuses}
+            print(f"http {name}: p50 {results[name]['p50'] * 1000:.1f} ms, {throughput:.0f} rps")
+    return results
+
+
+async def main(args: argparse.Namespace):
+    parameters = dataset.parameters_from(args)
+    engine = create_benchmark_engine()
+    session_factory = create_session_factory(engine)
+    revision = git_revision()
+    results = {
+        "revision": revision,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "dataset": asdict(parameters),
+    }
+    if not args.skip_generate:
+        results["generate"] = await dataset.generate(engine, parameters)
+    async with session_factory() as session:
+        territories = await dataset.territories(session)
+
+    results["crud"] = await run_crud(session_factory, Workload(parameters, territories), args.iterations)
+    await engine.dispose()
+    if not args.skip_http:
+        results["http"] = await run_http(
+            args.base_url, Workload(parameters, territories), args.requests, args.concurrency
+        )
+
+    output = Path(args.output) if args.output else RESULTS_DIRECTORY / f"{revision or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    dataset.add_arguments(parser)
+    parser.add_argument("--skip-generate", action="store_true", help="Reuse the dataset of a previous run")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per CRUD function")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", help="Results file, benchmarks/results/<commit>.json by default")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.crud import bulk
+
+COLUMNS = [column for column in bulk.aggregated_staging.columns if column.name != "seq"]
+VALID = b'{"indicator_id": 1, "territory_id": 2, "year": 2020, "value": 1.5, "source": "s"}'
+
+
+def _records(body: bytes, progress=None) -> list[tuple]:
+    async def chunks():
+        yield body
+
+    async def collect():
+        return [record async for record in bulk._iter_ndjson_records(chunks(), COLUMNS, progress)]
+
+    return asyncio.run(collect())
+
+
+def test_valid_lines_are_read_in_column_order():
+    assert _records(VALID + b"\n") == [(1, 2, None, 2020, 1.5, "s")]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b"[1, 2]",
+        b"5",
+        b'{"indicator_id": 1, "territory_id": 2, "year": "2020", "value": 1, "source": "s"}',
+        b'{"indicator_id": 1, "territory_id": 2147483648, "year": 2020, "value": 1, "source": "s"}',
+        b'{"indicator_id": true, "territory_id": 2, "year": 2020, "value": 1, "source": "s"}',
+        b'{"indicator_id": 1, "territory_id": 2, "year": 2020, "value": "1", "source": "s"}',
+        b'{"indicator_id": 1, "territory_id": 2, "year": 2020, "value": 1, "source": 5}',
+        b"{not json",
+    ],
+)
+def test_invalid_line_is_rejected_with_its_number(line):
+    with pytest.raises(HTTPException) as error:
+        _records(VALID + b"\n\n" + line + b"\n")
+    assert error.value.status_code == 400
+    assert error.value.detail.startswith("Invalid NDJSON line 3:")
+
+
+def test_invalid_lines_are_counted_as_failed_with_a_progress():
+    progress = bulk.LoadProgress()
+    records = _records(VALID + b"\n[1, 2]\n" + VALID.replace(b"2020", b'"2020"'), progress)
+    assert len(records) == 1
+    assert (progress.rows_processed, progress.rows_failed) == (3, 2)
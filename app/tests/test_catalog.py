@@ -0,0 +1,23 @@
+import asyncio
+
+from app.core.cache import TTLCache
+from app.core.catalog import CatalogCache
+
+
+def test_concurrent_misses_load_once():
+    catalog = CatalogCache(maxsize=10, ttl=60)
+    cache = TTLCache(10, 60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        # the first request releases the lock while the others still wait for it
+        return await asyncio.gather(*(catalog._get(cache, 1, load) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(loads) == 1
+    assert not catalog._loading and not catalog._waiters
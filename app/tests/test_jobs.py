@@ -0,0 +1,21 @@
+import asyncio
+
+from app.core import jobs
+from app.core.config import settings
+from app.models.indicator import AGGREGATED
+
+
+def test_spooled_body_is_read_back_in_chunks(monkeypatch):
+    # a spool size below the body makes it roll over to disk
+    monkeypatch.setattr(settings, "ingestion_spool_size", 10)
+    monkeypatch.setattr(jobs, "CHUNK_SIZE", 4)
+
+    async def body():
+        for chunk in (b"abc", b"defgh", b"ijklmnop"):
+            yield chunk
+
+    async def main():
+        job = jobs.Job(AGGREGATED, await jobs.spool(body()), "application/x-ndjson")
+        return [chunk async for chunk in job.chunks()]
+
+    assert b"".join(asyncio.run(main())) == b"abcdefghijklmnop"
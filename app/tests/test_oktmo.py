@@ -0,0 +1,18 @@
+from app.core import oktmo as oktmo_codes
+from app.crud import rollup
+
+
+def test_settlement_in_a_district_rolls_up_to_district_and_region():
+    assert rollup.parents(45301123) == [45301000, 45000000]
+
+
+def test_settlement_directly_in_a_region_rolls_up_to_the_region_only():
+    assert rollup.parents(45000123) == [45000000]
+    assert not oktmo_codes.is_child(45000123, oktmo_codes.DISTRICT)
+    assert oktmo_codes.is_child(45000123, oktmo_codes.REGION)
+
+
+def test_region_children_are_its_districts_and_direct_settlements():
+    assert oktmo_codes.is_child(45301000, oktmo_codes.REGION)
+    assert not oktmo_codes.is_child(45301123, oktmo_codes.REGION)
+    assert not oktmo_codes.is_child(45000000, oktmo_codes.REGION)
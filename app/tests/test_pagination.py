@@ -0,0 +1,16 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("name", ["a", 3]), "name", (str, int)) == ["a", 3]
+
+
+@pytest.mark.parametrize("key", [1, "a", [], ["a"], ["a", 1, 2], [1, "a"], ["a", [1]], ["a", {"id": 1}], ["a", True]])
+def test_malformed_cursor_key_is_rejected(key):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor("name", key), "name", (str, int))
+    assert error.value.status_code == 400
+    assert error.value.detail == "INVALID_CURSOR"
@@ -0,0 +1,31 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import pyramid
+from app.main import app
+from app.schemas.indicator import IndicatorDetailedData
+
+
+def test_bins_are_sorted_by_age():
+    assert pyramid.parse_bins("65+,15-64,0-14") == [(0, 14), (15, 64), (65, None)]
+
+
+@pytest.mark.parametrize("spec", ["0-14,5-20", "0-14,14-20", "60+,70-80", "0-14,10+", "20-10"])
+def test_overlapping_or_reversed_bins_are_rejected(spec):
+    with pytest.raises(ValueError):
+        pyramid.parse_bins(spec)
+
+
+def test_overlapping_bins_are_a_bad_request():
+    response = TestClient(app).get("/indicators/1/1/detailed", params={"bins": "0-14,5-20"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Overlapping age bins 0-14 and 5-20"
+
+
+def test_rebin_keeps_the_total():
+    data = [
+        IndicatorDetailedData(age_start=0, age_end=9, male=10, female=20),
+        IndicatorDetailedData(age_start=10, age_end=19, male=10, female=20),
+    ]
+    rebinned = pyramid.rebin(data, pyramid.parse_bins("0-4,5-19"))
+    assert [(band.male, band.female) for band in rebinned] == [(5, 10), (15, 30)]
@@ -0,0 +1,26 @@
+import asyncio
+
+from app.core.config import settings
+from app.crud import pyramids as pyramid_crud, values as values_crud
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+
+
+def test_rows_storage_leaves_the_pyramids_alone(monkeypatch):
+    monkeypatch.setattr(settings, "detailed_storage", "rows")
+    db = RecordingSession()
+    asyncio.run(pyramid_crud.refresh_pyramids(db, values_crud.written_keys(1, 1, None, [2020]), by_oktmo=False))
+    assert db.statements == []
+
+
+def test_arrays_storage_refreshes_the_pyramids(monkeypatch):
+    monkeypatch.setattr(settings, "detailed_storage", "arrays")
+    db = RecordingSession()
+    asyncio.run(pyramid_crud.refresh_pyramids(db, values_crud.written_keys(1, 1, None, [2020]), by_oktmo=False))
+    assert len(db.statements) == 2
@@ -0,0 +1,161 @@
+"""EXPLAIN every read in crud.indicator against a seeded Postgres.
+
+Runs against the throwaway database of the benchmarks and is skipped without it:
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m pytest tests/test_query_plans.py
+"""
+import asyncio
+import json
+import os
+
+import pytest
+from sqlalchemy import event, text
+
+from app.crud import indicator as indicator_crud
+from app.models import indicator as indicator_models
+from benchmarks.common import create_benchmark_engine, create_session_factory, reset_schema
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("BENCHMARK_DATABASE_URL"), reason="needs the benchmark database in BENCHMARK_DATABASE_URL"
+)
+
+VALUE_TABLES = (
+    indicator_models.AggregatedIndicatorValue.__tablename__,
+    indicator_models.DetailedIndicatorValue.__tablename__,
+    indicator_models.IndicatorValueAvailability.__tablename__,
+)
+
+SEED = [
+    "INSERT INTO units (id, unit_name) VALUES (1, 'people')",
+    "INSERT INTO indicators (id, name, unit_id) SELECT i, 'indicator ' || i, 1 FROM generate_series(1, 100) i",
+    # every other territory is keyed by oktmo
+    """
+    INSERT INTO aggregated_indicator_values (indicator_id, territory_id, oktmo, year, value, source)
+    SELECT i, t, CASE WHEN t % 2 = 0 THEN 45000000 + t END, y, random() * 1000, 'seed'
+    FROM generate_series(1, 100) i, generate_series(1, 1000) t, generate_series(2014, 2023) y
+    """,
+    """
+    INSERT INTO detailed_indicator_values
+        (indicator_id, territory_id, oktmo, year, source, age_start, age_end, male, female)
+    SELECT i, t, CASE WHEN t % 2 = 0 THEN 45000000 + t END, y, 'seed', a * 5,
+        CASE WHEN a < 19 THEN a * 5 + 4 END, random() * 1000, random() * 1000
+    FROM generate_series(1, 20) i, generate_series(1, 200) t, generate_series(2019, 2023) y, generate_series(0, 19) a
+    """,
+    """
+    INSERT INTO indicator_value_availability (indicator_id, kind, year, territory_id, oktmo, source)
+    SELECT DISTINCT indicator_id, 'aggregated', year, territory_id, oktmo, source FROM aggregated_indicator_values
+    UNION ALL
+    SELECT DISTINCT indicator_id, 'detailed', year, territory_id, oktmo, source FROM detailed_indicator_values
+    """,
+]
+
+# name, read, its arguments and whether the index covers every column it returns;
+# the aggregated reads return the row id, which is not part of the covering indexes
+READS = [
+    (
+        "aggregated by territory_id",
+        indicator_crud.get_aggregated_indicator_values,
+        dict(territory_id=11, oktmo=None),
+        False,
+    ),
+    (
+        "aggregated by territory_id and year",
+        indicator_crud.get_aggregated_indicator_values,
+        dict(territory_id=11, oktmo=None, year=2020),
+        False,
+    ),
+    (
+        "aggregated by oktmo",
+        indicator_crud.get_aggregated_indicator_values,
+        dict(territory_id=None, oktmo=45000012),
+        False,
+    ),
+    ("detailed by territory_id", indicator_crud.get_detailed_indicator_values, dict(territory_id=11, oktmo=None), True),
+    (
+        "detailed by territory_id and year",
+        indicator_crud.get_detailed_indicator_values,
+        dict(territory_id=11, oktmo=None, year=2020),
+        True,
+    ),
+    (
+        "detailed by oktmo",
+        indicator_crud.get_detailed_indicator_values,
+        dict(territory_id=None, oktmo=45000012),
+        True,
+    ),
+    ("aggregated availability", indicator_crud.get_aggregated_indicator_values_availability, {}, True),
+    ("detailed availability", indicator_crud.get_detailed_indicator_values_availability, {}, True),
+]
+
+
+def value_table_scans(plan: dict, relations: set[str]) -> list[tuple[str, str]]:
+    """(node type, relation) of every scan of the given value tables and partitions"""
+    scans = []
+    if plan.get("Relation Name") in relations:
+        scans.append((plan["Node Type"], plan["Relation Name"]))
+    for child in plan.get("Plans", []):
+        scans.extend(value_table_scans(child, relations))
+    return scans
+
+
+async def non_empty_relations(conn) -> set[str]:
+    """The value tables and their year partitions that hold rows.
+
+    Scanning an empty partition sequentially is the cheapest plan and not a regression.
+    """
+    result = await conn.execute(
+        text("SELECT relname FROM pg_class WHERE relkind IN ('r', 'p') AND reltuples > 0 AND relname LIKE ANY(:names)"),
+        {"names": [f"{table}%" for table in VALUE_TABLES]},
+    )
+    return set(result.scalars())
+
+
+async def explain_reads() -> dict[str, list[tuple[str, str]]]:
+    engine = create_benchmark_engine()
+    session_factory = create_session_factory(engine)
+    await reset_schema(engine)
+    async with engine.begin() as conn:
+        for statement in SEED:
+            await conn.execute(text(statement))
+    # index-only scans need the visibility map, which VACUUM sets
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+        relations = await non_empty_relations(conn)
+
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    scans = {}
+    try:
+        for name, read, kwargs, _ in READS:
+            recorded.clear()
+            async with session_factory() as session:
+                await read(session, indicator_id=7, **kwargs)
+            statements = list(recorded)
+            scans[name] = []
+            async with engine.connect() as conn:
+                for statement, parameters in statements:
+                    plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    scans[name].extend(value_table_scans(plan[0]["Plan"], relations))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+        await engine.dispose()
+    return scans
+
+
+@pytest.fixture(scope="module")
+def scans():
+    return asyncio.run(explain_reads())
+
+
+@pytest.mark.parametrize("name, covered", [(name, covered) for name, _, _, covered in READS])
+def test_read_is_served_by_an_index(scans, name, covered):
+    assert scans[name], f"{name} reads no value table"
+    expected = {"Index Only Scan"} if covered else {"Index Only Scan", "Index Scan", "Bitmap Heap Scan"}
+    assert {node_type for node_type, _ in scans[name]} <= expected, scans[name]
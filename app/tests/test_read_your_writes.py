@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import DataError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.api.endpoints import indicators as indicators_endpoints
+from app.core.response_cache import response_cache
+from app.crud import indicator as indicator_crud
+from app.db import session as db_session
+from app.db.session import READ_YOUR_WRITES_HEADER, get_read_db
+from app.main import app
+
+URL = "/indicators/1/aggregated?territory_id=1"
+
+
+def _row(value: float) -> dict:
+    return dict(
+        id=1, indicator_id=1, name="n", unit="u", territory_id=1, oktmo=None, year=2020, source="s", value=value
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client whose aggregated reads return the current `stored` value, `replica` makes the session a replica one"""
+    state = {"stored": 1.0, "replica": False, "reads": 0}
+
+    async def get_aggregated_indicator_values(db, **kwargs):
+        state["reads"] += 1
+        return [_row(state["stored"])]
+
+    async def read_db():
+        yield None
+
+    monkeypatch.setattr(indicator_crud, "get_aggregated_indicator_values", get_aggregated_indicator_values)
+    monkeypatch.setattr(indicators_endpoints, "on_replica", lambda db: state["replica"])
+    app.dependency_overrides[get_read_db] = read_db
+    response_cache.entries.clear()
+    yield TestClient(app), state
+    app.dependency_overrides.clear()
+    response_cache.entries.clear()
+
+
+def test_read_your_writes_skips_the_cache(client):
+    client, state = client
+    assert client.get(URL).json()[0]["value"] == 1.0
+    state["stored"] = 2.0
+    # a plain read is served from the cache, a read asking for its own writes is not and does not refill it
+    assert client.get(URL).json()[0]["value"] == 1.0
+    assert client.get(URL, headers={READ_YOUR_WRITES_HEADER: "true"}).json()[0]["value"] == 2.0
+    assert client.get(URL).json()[0]["value"] == 1.0
+    assert state["reads"] == 2
+
+
+def test_replica_reads_are_not_cached(client):
+    client, state = client
+    state["replica"] = True
+    client.get(URL)
+    client.get(URL)
+    assert state["reads"] == 2
+    assert not list(response_cache.entries)
+
+
+def test_replica_session_falls_back_to_the_primary(monkeypatch):
+    primary = create_async_engine("postgresql+asyncpg://user@primary/db")
+    replica = create_async_engine("postgresql+asyncpg://user@replica/db")
+    monkeypatch.setattr(db_session, "engine", primary)
+    monkeypatch.setattr(db_session, "read_engine", replica)
+    binds = []
+
+    async def execute(self, statement, *args, **kwargs):
+        binds.append(self.bind)
+        if self.bind is replica:
+            raise OSError("replica is gone")
+        return "result"
+
+    monkeypatch.setattr(AsyncSession, "execute", execute)
+    session = db_session.ReplicaSession(bind=replica)
+    assert asyncio.run(session.execute("SELECT 1")) == "result"
+    assert binds == [replica, primary]
+    assert not db_session.on_replica(session)
+
+
+def test_replica_session_raises_statement_errors(monkeypatch):
+    primary = create_async_engine("postgresql+asyncpg://user@primary/db")
+    replica = create_async_engine("postgresql+asyncpg://user@replica/db")
+    monkeypatch.setattr(db_session, "engine", primary)
+    monkeypatch.setattr(db_session, "read_engine", replica)
+    monkeypatch.setattr(db_session, "_replica_down_until", 0.0)
+    binds = []
+
+    async def execute(self, statement, *args, **kwargs):
+        binds.append(self.bind)
+        raise DataError("SELECT 1", {}, Exception("value out of int32 range"))
+
+    monkeypatch.setattr(AsyncSession, "execute", execute)
+    session = db_session.ReplicaSession(bind=replica)
+    with pytest.raises(DataError):
+        asyncio.run(session.execute("SELECT 1"))
+    assert binds == [replica]
+    assert db_session.on_replica(session)
+    assert db_session._replica_down_until == 0.0
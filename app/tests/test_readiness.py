@@ -0,0 +1,21 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.db import warmup
+from app.main import app
+
+
+def test_failed_warm_up_still_reports_ready(monkeypatch):
+    async def warm_up():
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(warmup, "warm_up", warm_up)
+    with TestClient(app) as client:
+        for _ in range(100):
+            response = client.get("/status/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.01)
+    assert response.status_code == 200
+    assert response.json()["ready"]
@@ -0,0 +1,21 @@
+from app.core.response_cache import AGGREGATED, CacheKey, ResponseCache
+
+KEY = CacheKey(AGGREGATED, 1, 1, None, None)
+
+
+def test_put_keeps_the_body_read_before_no_invalidation():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    generation = cache.generation(KEY)
+    cache.put(KEY, b"[]", generation)
+    assert cache.get(KEY).body == b"[]"
+
+
+def test_put_drops_a_body_read_before_an_invalidation():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    generation = cache.generation(KEY)
+    # a load of another territory of the indicator commits while the read runs
+    cache.invalidate(AGGREGATED, 1, territory_id=2)
+    assert cache.put(KEY, b"[]", generation).body == b"[]"
+    assert cache.get(KEY) is None
+    cache.put(KEY, b"[]", cache.generation(KEY))
+    assert cache.get(KEY) is not None
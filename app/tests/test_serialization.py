@@ -0,0 +1,31 @@
+import orjson
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.serialization import RowSerializer
+from app.schemas.indicator import IndicatorAggregatedResponse
+
+ROW = dict(id=1, indicator_id=1, name="n", unit="u", territory_id=1, oktmo=None, source="s")
+ROWS = [dict(ROW, year=2020, value=1.5), dict(ROW, id=2, year=2021, value=float("nan"))]
+
+
+@pytest.mark.parametrize("method", ["dump_json", "dump_lines"])
+def test_default_and_fast_paths_write_the_same_bytes(monkeypatch, method):
+    serializer = RowSerializer(IndicatorAggregatedResponse)
+    monkeypatch.setattr(settings, "fast_json", False)
+    default = getattr(serializer, method)(ROWS)
+    monkeypatch.setattr(settings, "fast_json", True)
+    assert getattr(serializer, method)(ROWS) == default
+
+
+def test_lines_are_valid_json_per_row(monkeypatch):
+    monkeypatch.setattr(settings, "fast_json", False)
+    lines = RowSerializer(IndicatorAggregatedResponse).dump_lines(ROWS).splitlines()
+    assert [orjson.loads(line)["value"] for line in lines] == [1.5, None]
+
+
+def test_default_path_validates_the_lines(monkeypatch):
+    monkeypatch.setattr(settings, "fast_json", False)
+    with pytest.raises(ValidationError):
+        RowSerializer(IndicatorAggregatedResponse).dump_lines([dict(ROWS[0], year="not a year")])
@@ -0,0 +1,147 @@
+"""Check that the value reads and loads send a constant number of SQL statements.
+
+Each read and load in crud.indicator runs for a small and a large indicator
+with the statements counted by the request SQL counter of app.core.metrics,
+a count growing with the rows is the sign of a lazy load per row. Runs
+against the throwaway database of the benchmarks and is skipped without it:
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m pytest tests/test_statement_counts.py
+"""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.core import metrics
+from app.crud import indicator as indicator_crud
+from app.schemas import indicator as schemas
+from benchmarks.common import create_benchmark_engine, create_session_factory, reset_schema
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("BENCHMARK_DATABASE_URL"), reason="needs the benchmark database in BENCHMARK_DATABASE_URL"
+)
+
+SMALL_YEARS, LARGE_YEARS = 1, 30
+SMALL, LARGE = 1, 2
+
+SEED = [
+    "INSERT INTO units (id, unit_name) VALUES (1, 'people')",
+    "INSERT INTO indicators (id, name, unit_id) VALUES (1, 'small', 1), (2, 'large', 1), (3, 'small load', 1), "
+    "(4, 'large load', 1)",
+    f"""
+    INSERT INTO aggregated_indicator_values (indicator_id, territory_id, oktmo, year, value, source)
+    SELECT i, 11, NULL, 2000 + y, random() * 1000, 'seed'
+    FROM generate_series(1, 2) i, generate_series(1, {LARGE_YEARS}) y
+    WHERE i = {LARGE} OR y <= {SMALL_YEARS}
+    """,
+    f"""
+    INSERT INTO detailed_indicator_values
+        (indicator_id, territory_id, oktmo, year, source, age_start, age_end, male, female)
+    SELECT i, 11, NULL, 2000 + y, 'seed', a * 5, CASE WHEN a < 19 THEN a * 5 + 4 END, random() * 1000, random() * 1000
+    FROM generate_series(1, 2) i, generate_series(1, {LARGE_YEARS}) y, generate_series(0, 19) a
+    WHERE i = {LARGE} OR y <= {SMALL_YEARS}
+    """,
+    """
+    INSERT INTO indicator_value_availability (indicator_id, kind, year, territory_id, oktmo, source)
+    SELECT DISTINCT indicator_id, 'aggregated', year, territory_id, oktmo, source FROM aggregated_indicator_values
+    UNION ALL
+    SELECT DISTINCT indicator_id, 'detailed', year, territory_id, oktmo, source FROM detailed_indicator_values
+    """,
+    "ANALYZE",
+]
+
+
+def aggregated_values(years: int) -> list[schemas.LoadIndicatorAggregatedRequest]:
+    return [
+        schemas.LoadIndicatorAggregatedRequest(year=2000 + year, value=year, source="load") for year in range(years)
+    ]
+
+
+def detailed_values(bands: int) -> schemas.LoadIndicatorDetailedRequest:
+    data = [schemas.IndicatorDetailedData(age_start=band, age_end=band, male=1, female=1) for band in range(bands)]
+    return schemas.LoadIndicatorDetailedRequest(year=2000, source="load", data=data)
+
+
+# name, call and its arguments for the small and the large indicator
+CALLS = [
+    (
+        "aggregated values",
+        indicator_crud.get_aggregated_indicator_values,
+        dict(indicator_id=SMALL, territory_id=11, oktmo=None),
+        dict(indicator_id=LARGE, territory_id=11, oktmo=None),
+    ),
+    (
+        "detailed values",
+        indicator_crud.get_detailed_indicator_values,
+        dict(indicator_id=SMALL, territory_id=11, oktmo=None),
+        dict(indicator_id=LARGE, territory_id=11, oktmo=None),
+    ),
+    (
+        "aggregated availability",
+        indicator_crud.get_aggregated_indicator_values_availability,
+        dict(indicator_id=SMALL),
+        dict(indicator_id=LARGE),
+    ),
+    (
+        "detailed availability",
+        indicator_crud.get_detailed_indicator_values_availability,
+        dict(indicator_id=SMALL),
+        dict(indicator_id=LARGE),
+    ),
+    (
+        "aggregated load",
+        indicator_crud.create_aggregated_indicator_values,
+        dict(indicator_id=3, territory_id=11, oktmo=None, indicator_values=aggregated_values(SMALL_YEARS)),
+        dict(indicator_id=4, territory_id=11, oktmo=None, indicator_values=aggregated_values(LARGE_YEARS)),
+    ),
+    (
+        "detailed load",
+        indicator_crud.load_detailed_indicator_values,
+        dict(indicator_id=3, territory_id=11, oktmo=None, request=detailed_values(2)),
+        dict(indicator_id=4, territory_id=11, oktmo=None, request=detailed_values(20)),
+    ),
+]
+
+
+async def count_statements(session_factory, call, kwargs) -> int:
+    request_sql = metrics.RequestSql()
+    token = metrics.current_request_sql.set(request_sql)
+    try:
+        async with session_factory() as session:
+            await call(session, **kwargs)
+    finally:
+        metrics.current_request_sql.reset(token)
+    return request_sql.statements
+
+
+async def count_all() -> dict[str, tuple[int, int]]:
+    engine = create_benchmark_engine()
+    metrics.instrument_engine(engine, "benchmark")
+    session_factory = create_session_factory(engine)
+    await reset_schema(engine)
+    async with engine.begin() as conn:
+        for statement in SEED:
+            await conn.execute(text(statement))
+    counts = {}
+    try:
+        for name, call, small, large in CALLS:
+            counts[name] = (
+                await count_statements(session_factory, call, small),
+                await count_statements(session_factory, call, large),
+            )
+    finally:
+        await engine.dispose()
+    return counts
+
+
+@pytest.fixture(scope="module")
+def counts():
+    return asyncio.run(count_all())
+
+
+@pytest.mark.parametrize("name", [name for name, *_ in CALLS])
+def test_statement_count_does_not_grow_with_the_rows(counts, name):
+    small, large = counts[name]
+    assert small > 0
+    assert large == small